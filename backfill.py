@@ -0,0 +1,240 @@
+import argparse
+import multiprocessing
+import queue
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from functools import partial
+from multiprocessing.pool import AsyncResult
+from typing import Any
+
+import dotenv
+from pathier import Pathier
+
+import ratelimit
+import writer
+from data_service import EtsyDataService
+from db import shared_db
+from etsy import AuthenticatedClient
+
+# Seconds the writer waits for a message before checking whether the workers have finished.
+POLL_INTERVAL: float = 1.0
+
+_queue: "multiprocessing.Queue[tuple[Any, ...]]"
+
+
+class QueuedTokensClient(AuthenticatedClient):
+    """
+    `AuthenticatedClient` that sends refreshed tokens to the writer process instead of saving them itself.
+    """
+
+    def save_tokens(self) -> None:
+        _queue.put(
+            (
+                "tokens",
+                self.shop_id,
+                self.client.access_token,
+                self.client.refresh_token,
+                self.client.expiry,
+            )
+        )
+
+
+def get_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Pull sales data for many shops at once using their stored tokens."
+    )
+    parser.add_argument(
+        "shop_ids",
+        type=int,
+        nargs="*",
+        help="The shops to pull. Defaults to every shop with stored tokens.",
+    )
+    parser.add_argument(
+        "-p",
+        "--processes",
+        type=int,
+        default=4,
+        help="The number of shops fetched at once, each in its own process.",
+    )
+    parser.add_argument(
+        "-f",
+        "--full",
+        action="store_true",
+        help="Fetch each shop's entire history instead of only receipts newer than the last sync.",
+    )
+    return parser.parse_args()
+
+
+def _init_worker(
+    pages: "multiprocessing.Queue[tuple[Any, ...]]", processes: int
+) -> None:
+    global _queue
+    _queue = pages
+    ratelimit.split_rate_limit(processes)
+
+
+def fetch_shop(shop_id: int, full: bool) -> None:
+    """
+    Fetch a shop's receipts page by page and send them to the writer.
+
+    Always finishes by sending a 'done' message with the error, if any.
+
+    Parameters
+    ----------
+    shop_id : int
+        The shop to fetch.
+    full : bool
+        Whether to ignore the shop's sync cursor.
+    """
+    error: str | None = None
+    try:
+        client: QueuedTokensClient = QueuedTokensClient.from_stored(shop_id)
+        cursor: int | None = None
+        if not full:
+            with shared_db() as db:
+                cursor = db.get_sync_cursor(shop_id)
+        for page in client.iter_sales_pages(min_created=cursor):
+            _queue.put(("page", shop_id, page))
+    except Exception as e:
+        error = str(e)
+    _queue.put(("done", shop_id, error))
+
+
+def write(
+    pages: "multiprocessing.Queue[tuple[Any, ...]]",
+    shop_ids: list[int],
+    result: "AsyncResult[Any]",
+) -> dict[str, int]:
+    """
+    Submit everything the workers send to the ingest writer until every shop is done.
+
+    The writer thread is the only connection writing to the database,
+    it groups pages from every shop into shared transactions.
+
+    Parameters
+    ----------
+    pages : multiprocessing.Queue[tuple[Any, ...]]
+        The queue workers send to.
+    shop_ids : list[int]
+        The shops being fetched.
+    result : AsyncResult[Any]
+        The pool's result for the fetches.
+        If it finishes and the queue stays empty, shops that never sent 'done' are failed.
+
+    Returns
+    -------
+    dict[str, int]
+        Totals for 'receipts', 'rows', and 'failed' shops.
+    """
+    ingest: writer.IngestWriter = writer.get_writer()
+    totals: dict[str, int] = {"receipts": 0, "rows": 0, "failed": 0}
+    submitted: dict[int, list[tuple[int, Future[tuple[int, int]]]]] = {}
+    token_writes: dict[int, list[Future[None]]] = {}
+    outstanding: set[int] = set(shop_ids)
+    done: int = 0
+    drained: bool = False
+
+    def finish(shop_id: int, error: str | None) -> None:
+        nonlocal done
+        done += 1
+        outstanding.discard(shop_id)
+        receipts: int = 0
+        for size, future in submitted.pop(shop_id, []):
+            try:
+                inserted, updated = future.result()
+            except Exception as e:
+                error = error or str(e)
+                break
+            receipts += size
+            totals["rows"] += inserted + updated
+        for future in token_writes.pop(shop_id, []):
+            try:
+                future.result()
+            except Exception as e:
+                writer.get_logger().exception(
+                    f"Error saving refreshed tokens for shop {shop_id}\n"
+                )
+                error = error or f"saving refreshed tokens failed: {e}"
+        totals["receipts"] += receipts
+        if error:
+            totals["failed"] += 1
+            print(f"[{done}/{len(shop_ids)}] shop {shop_id} failed: {error}")
+        else:
+            print(f"[{done}/{len(shop_ids)}] shop {shop_id}: {receipts} receipts")
+
+    while outstanding:
+        try:
+            message: tuple[Any, ...] = pages.get(timeout=POLL_INTERVAL)
+        except queue.Empty:
+            if not result.ready():
+                continue
+            # a worker's last messages can still be in flight when the pool reports it's finished
+            if not drained:
+                drained = True
+                continue
+            error: str = "worker finished without reporting the shop as done"
+            if not result.successful():
+                try:
+                    result.get()
+                except Exception as e:
+                    error = f"worker failed: {e}"
+            for shop_id in sorted(outstanding):
+                finish(shop_id, error)
+            break
+        drained = False
+        kind: str = message[0]
+        shop_id: int = message[1]
+        if kind == "page":
+            shop_pages: list[tuple[int, Future[tuple[int, int]]]] = (
+                submitted.setdefault(shop_id, [])
+            )
+            # each page depends on the last so a failed page stops the sync cursor advancing past it
+            future: Future[tuple[int, int]] = ingest.submit(
+                partial(EtsyDataService.save_page, shop_id=shop_id, data=message[2]),
+                shop_id,
+                shop_pages[-1][1] if shop_pages else None,
+            )
+            shop_pages.append((len(message[2]), future))
+        elif kind == "tokens":
+            tokens: tuple[Any, ...] = message[1:]
+            token_writes.setdefault(shop_id, []).append(
+                ingest.submit(lambda db, tokens=tokens: db.save_tokens(*tokens))
+            )
+        elif kind == "done" and shop_id in outstanding:
+            finish(shop_id, message[2])
+    return totals
+
+
+def main(args: argparse.Namespace | None = None) -> None:
+    """Fetch shops in a process pool and write their data from this process."""
+    args = args or get_args()
+    dotenv.load_dotenv(Pathier(__file__).parent / ".env")
+    shop_ids: list[int] = args.shop_ids
+    if not shop_ids:
+        with shared_db() as db:
+            shop_ids = db.get_token_shop_ids()
+    print(f"Backfilling {len(shop_ids)} shops with {args.processes} processes.")
+    start: float = time.perf_counter()
+    # bounded so fetching can't outrun writing by more than a few pages per process
+    pages: "multiprocessing.Queue[tuple[Any, ...]]" = multiprocessing.Queue(
+        args.processes * 4
+    )
+    with multiprocessing.Pool(
+        args.processes, initializer=_init_worker, initargs=(pages, args.processes)
+    ) as pool:
+        result: AsyncResult[list[None]] = pool.starmap_async(
+            fetch_shop, [(shop_id, args.full) for shop_id in shop_ids]
+        )
+        totals: dict[str, int] = write(pages, shop_ids, result)
+    elapsed: float = time.perf_counter() - start
+    print(
+        f"Finished at {datetime.now():%H:%M:%S} in {elapsed:.2f}s: "
+        f"{totals['receipts']} receipts ({totals['receipts'] / elapsed:.1f}/s), "
+        f"{totals['rows']} rows ({totals['rows'] / elapsed:.1f}/s), "
+        f"{totals['failed']} failed shops."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+import ratelimit
+from benchmarks.fake_etsy import FakeEtsyAPI
+from benchmarks.synthetic import generate_receipts
+from etsy import AuthenticatedClient
+from ratelimit import RateLimitedAdapter
+
+
+def get_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Compare connections opened by clients sharing `ratelimit.get_shared_adapter()` against clients with their own adapter."
+    )
+    parser.add_argument(
+        "-s",
+        "--shops",
+        type=int,
+        default=20,
+        help="Shops, each pulled by a new client.",
+    )
+    parser.add_argument(
+        "-r", "--receipts", type=int, default=300, help="Receipts per shop."
+    )
+    parser.add_argument(
+        "-b",
+        "--burst",
+        type=int,
+        default=4,
+        help="Clients pulling at the same time.",
+    )
+    parser.add_argument(
+        "-l",
+        "--latency",
+        type=float,
+        default=0.01,
+        help="Simulated seconds of latency per request.",
+    )
+    parser.add_argument(
+        "--handshake",
+        type=float,
+        default=0.05,
+        help="Simulated seconds to open a connection, standing in for a TLS handshake.",
+    )
+    return parser.parse_args()
+
+
+def pull(shop_id: int, shared: bool) -> int:
+    """
+    Fetch a shop's receipts with a new client.
+
+    Returns
+    -------
+    int
+        The number of receipts.
+    """
+    client: AuthenticatedClient = AuthenticatedClient(
+        {
+            "access_token": f"{shop_id}.benchmark",
+            "refresh_token": f"{shop_id}.benchmark",
+            "expires_in": "3600",
+        },
+        shop_id,
+    )
+    if not shared:
+        # how every client worked before the adapter was shared
+        adapter: RateLimitedAdapter = RateLimitedAdapter(ratelimit.get_bucket())
+        client.client.session.mount("https://", adapter)
+        client.client.session.mount("http://", adapter)
+    return len(client.get_sales_data())
+
+
+def main(args: argparse.Namespace | None = None) -> None:
+    args = args or get_args()
+    os.environ.setdefault("sc_keystring", "benchmark")
+    ratelimit.BUCKET = ratelimit.TokenBucket(1_000_000, 1_000_000)
+    receipts: dict[int, list[dict[str, Any]]] = {
+        shop_id: generate_receipts(shop_id, args.receipts, seed=shop_id)
+        for shop_id in range(1, args.shops + 1)
+    }
+    for shared in (False, True):
+        with FakeEtsyAPI(receipts, args.latency, args.handshake) as api:
+            start: float = time.perf_counter()
+            with ThreadPoolExecutor(args.burst) as executor:
+                total: int = sum(
+                    executor.map(lambda shop_id: pull(shop_id, shared), receipts)
+                )
+            elapsed: float = time.perf_counter() - start
+        print(
+            f"{'shared' if shared else 'per client':<10} receipts={total} requests={api.requests} "
+            f"connections={api.connections} reuse={api.requests / api.connections:.1f} time={elapsed:.3f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
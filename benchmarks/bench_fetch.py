@@ -0,0 +1,70 @@
+import argparse
+import os
+import time
+from typing import Any
+
+import ratelimit
+from benchmarks.fake_etsy import FakeEtsyAPI
+from benchmarks.synthetic import generate_receipts
+from etsy import AuthenticatedClient
+
+
+def get_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Time `AuthenticatedClient.get_sales_data()` against a local fake receipts endpoint."
+    )
+    parser.add_argument(
+        "-r", "--receipts", type=int, default=3000, help="Receipts in the shop."
+    )
+    parser.add_argument(
+        "-l",
+        "--latency",
+        type=float,
+        default=0.05,
+        help="Simulated seconds of latency per request.",
+    )
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        type=int,
+        nargs="*",
+        default=[1, 2, 4, 8],
+        help="Concurrency limits to compare.",
+    )
+    parser.add_argument(
+        "--rate-limit",
+        type=float,
+        default=1000,
+        help="Requests per second allowed by the client side rate limiter.",
+    )
+    return parser.parse_args()
+
+
+def main(args: argparse.Namespace | None = None) -> None:
+    args = args or get_args()
+    os.environ.setdefault("sc_keystring", "benchmark")
+    ratelimit.BUCKET = ratelimit.TokenBucket(args.rate_limit, args.rate_limit)
+    shop_id: int = 1
+    receipts: list[dict[str, Any]] = generate_receipts(shop_id, args.receipts, seed=0)
+    expected: list[dict[str, Any]] | None = None
+    with FakeEtsyAPI({shop_id: receipts}, args.latency):
+        for concurrency in args.concurrency:
+            client: AuthenticatedClient = AuthenticatedClient(
+                {
+                    "access_token": f"{shop_id}.benchmark",
+                    "refresh_token": "benchmark",
+                    "expires_in": "3600",
+                }
+            )
+            start: float = time.perf_counter()
+            results: list[dict[str, Any]] = client.get_sales_data(concurrency)
+            elapsed: float = time.perf_counter() - start
+            expected = expected or results
+            assert results == expected, "Results differ between concurrency levels."
+            print(
+                f"concurrency={concurrency:<3} receipts={len(results)} time={elapsed:.3f}s"
+            )
+
+
+if __name__ == "__main__":
+    main()
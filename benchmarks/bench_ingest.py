@@ -0,0 +1,131 @@
+import argparse
+import sys
+import threading
+import time
+from typing import Any, Callable, Iterable, Iterator
+
+import writer
+from benchmarks.synthetic import generate_receipts
+from benchmarks.temp_db import temp_database
+from data_service import EtsyDataService
+from db import close_shared_db, shared_db
+
+
+def get_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Compare concurrent pulls each committing their own pages with pulls sharing the ingest writer, and check both save every row."
+    )
+    parser.add_argument(
+        "-p",
+        "--producers",
+        type=int,
+        nargs="*",
+        default=[1, 4, 16],
+        help="Numbers of concurrent pulls to compare.",
+    )
+    parser.add_argument(
+        "-r",
+        "--receipts",
+        type=int,
+        default=2000,
+        help="Receipts per pull.",
+    )
+    parser.add_argument(
+        "-s",
+        "--page-size",
+        type=int,
+        default=100,
+        help="Receipts per page.",
+    )
+    parser.add_argument(
+        "-l",
+        "--latency",
+        type=float,
+        default=0.005,
+        help="Simulated seconds spent fetching each page.",
+    )
+    return parser.parse_args()
+
+
+def save_direct(shop_id: int, pages: Iterable[list[dict[str, Any]]]) -> None:
+    """Save and commit each page on this thread's own connection, as pulls did before the ingest writer."""
+    with shared_db() as db:
+        for page in pages:
+            EtsyDataService.save_page(db, shop_id, page)
+            db.commit()
+
+
+def run(
+    save: Callable[[int, Iterable[list[dict[str, Any]]]], Any],
+    data: dict[int, list[list[dict[str, Any]]]],
+    latency: float,
+) -> tuple[float, int]:
+    """
+    Run a pull for each shop in `data` at once, sleeping `latency` before each page as if fetching it.
+
+    Returns
+    -------
+    tuple[float, int]
+        The seconds taken and the number of pulls that failed.
+    """
+    errors: list[Exception] = []
+
+    def pull(shop_id: int) -> None:
+        def fetch() -> Iterator[list[dict[str, Any]]]:
+            for page in data[shop_id]:
+                time.sleep(latency)
+                yield page
+
+        try:
+            save(shop_id, fetch())
+        except Exception as e:
+            errors.append(e)
+        finally:
+            close_shared_db()
+
+    threads: list[threading.Thread] = [
+        threading.Thread(target=pull, args=(shop_id,)) for shop_id in data
+    ]
+    start: float = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, len(errors)
+
+
+def main(args: argparse.Namespace | None = None) -> None:
+    args = args or get_args()
+    failed: bool = False
+    for producers in args.producers:
+        data: dict[int, list[list[dict[str, Any]]]] = {}
+        rows: int = 0
+        for shop_id in range(1, producers + 1):
+            receipts: list[dict[str, Any]] = generate_receipts(
+                shop_id, args.receipts, seed=shop_id
+            )
+            rows += len(EtsyDataService._prep_transaction_rows(shop_id, receipts))
+            data[shop_id] = [
+                receipts[i : i + args.page_size]
+                for i in range(0, len(receipts), args.page_size)
+            ]
+        for name, save in (
+            ("direct", save_direct),
+            ("writer", EtsyDataService.save_transaction_pages),
+        ):
+            with temp_database() as db:
+                elapsed, errors = run(save, data, args.latency)
+                writer.stop_writer()
+                with db:
+                    saved: int = db.count("sales")
+            ok: bool = not errors and saved == rows
+            failed = failed or not ok
+            print(
+                f"producers={producers:<3} {name:<6} {elapsed:.3f}s {rows / elapsed:9.0f} rows/s"
+                f"{'' if ok else f' FAIL {errors} errors, {saved} of {rows} rows saved'}"
+            )
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+import argparse
+import sys
+import time
+from datetime import datetime
+from typing import Any, Callable
+
+from benchmarks.synthetic import generate_receipts
+from data_service import EtsyDataService
+
+
+def get_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Compare `EtsyDataService._prep_transaction_rows()` with the original dict based `prep_transaction_data()`, and a NumPy columnar prep if NumPy is installed, and check they agree."
+    )
+    parser.add_argument(
+        "-r",
+        "--receipts",
+        type=int,
+        nargs="*",
+        default=[100, 10_000, 100_000],
+        help="Receipt counts to compare.",
+    )
+    parser.add_argument(
+        "-n",
+        "--repeat",
+        type=int,
+        default=5,
+        help="Times to run each prep, the best is reported.",
+    )
+    return parser.parse_args()
+
+
+def prep_transaction_data(
+    shop_id: int, data: list[dict[str, Any]]
+) -> list[dict[str, Any]]:
+    """
+    Convert data returned from Etsy's API to database schema compatible format.
+
+    The original prep, kept as the reference `_prep_transaction_rows()` is checked against.
+
+    Parameters
+    ----------
+    shop_id : int
+        The shop id the given data is for.
+    data : list[dict[str, Any]]
+        The raw transaction data taken from the Etsy API.
+
+    Returns
+    -------
+    list[dict[str, Any]]
+        The transaction data prepped for database storage.
+    """
+    transactions: list[dict[str, Any]] = []
+    for receipt in data:
+        if receipt["seller_user_id"] == shop_id:
+            for transaction in receipt["transactions"]:
+                prepped: dict[str, Any] = {}
+                prepped["receipt_id"] = receipt["receipt_id"]
+                prepped["sale_date"] = datetime.fromtimestamp(
+                    receipt["created_timestamp"]
+                )
+                prepped["transaction_id"] = transaction["transaction_id"]
+                prepped["title"] = transaction["title"]
+                prepped["quantity"] = transaction["quantity"]
+                prepped["listing_id"] = transaction["listing_id"]
+                prepped["product_id"] = transaction["product_id"]
+                prepped["unit_price"] = float(transaction["price"]["amount"]) / (
+                    1.0
+                    if transaction["price"]["divisor"] == 0
+                    else transaction["price"]["divisor"]
+                )
+                prepped["total_price"] = prepped["unit_price"] * prepped["quantity"]
+                transactions.append(prepped)
+    return transactions
+
+
+def as_rows(
+    shop_id: int, transactions: list[dict[str, Any]], date_added: datetime
+) -> list[tuple[Any, ...]]:
+    """
+    Returns
+    -------
+    list[tuple[Any, ...]]
+        The output of `prep_transaction_data()` in the same form as `_prep_transaction_rows()`.
+    """
+    return [
+        (
+            transaction["listing_id"],
+            transaction["product_id"],
+            transaction["receipt_id"],
+            transaction["transaction_id"],
+            shop_id,
+            transaction["title"],
+            transaction["unit_price"],
+            transaction["quantity"],
+            transaction["total_price"],
+            transaction["sale_date"],
+            date_added,
+        )
+        for transaction in transactions
+    ]
+
+
+def prep_columnar(
+    shop_id: int, data: list[dict[str, Any]], date_added: datetime
+) -> list[tuple[Any, ...]]:
+    """
+    `_prep_transaction_rows()` with the price arithmetic done a column at a time in NumPy.
+
+    Kept for comparison, flattening the receipts into columns costs more than the arithmetic it speeds up.
+
+    Returns
+    -------
+    list[tuple[Any, ...]]
+        The same rows as `_prep_transaction_rows()`.
+    """
+    import numpy as np
+
+    listing_ids: list[int] = []
+    product_ids: list[int] = []
+    receipt_ids: list[int] = []
+    transaction_ids: list[int] = []
+    titles: list[str] = []
+    quantities: list[int] = []
+    amounts: list[int] = []
+    divisors: list[int] = []
+    sale_dates: list[datetime] = []
+    for receipt in data:
+        if receipt["seller_user_id"] == shop_id:
+            sale_date: datetime = datetime.fromtimestamp(receipt["created_timestamp"])
+            for transaction in receipt["transactions"]:
+                listing_ids.append(transaction["listing_id"])
+                product_ids.append(transaction["product_id"])
+                receipt_ids.append(receipt["receipt_id"])
+                transaction_ids.append(transaction["transaction_id"])
+                titles.append(transaction["title"])
+                quantities.append(transaction["quantity"])
+                amounts.append(transaction["price"]["amount"])
+                divisors.append(transaction["price"]["divisor"])
+                sale_dates.append(sale_date)
+    divisor_array = np.array(divisors, dtype=np.float64)
+    unit_prices = np.array(amounts, dtype=np.float64) / np.where(
+        divisor_array == 0, 1.0, divisor_array
+    )
+    total_prices = unit_prices * np.array(quantities, dtype=np.float64)
+    return list(
+        zip(
+            listing_ids,
+            product_ids,
+            receipt_ids,
+            transaction_ids,
+            [shop_id] * len(transaction_ids),
+            titles,
+            unit_prices.tolist(),
+            quantities,
+            total_prices.tolist(),
+            sale_dates,
+            [date_added] * len(transaction_ids),
+        )
+    )
+
+
+def best_time(function: Callable[[], Any], repeat: int) -> tuple[float, Any]:
+    """
+    Returns
+    -------
+    tuple[float, Any]
+        The fastest of `repeat` calls to `function` and its result.
+    """
+    best: float = float("inf")
+    result: Any = None
+    for _ in range(repeat):
+        start: float = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main(args: argparse.Namespace | None = None) -> None:
+    args = args or get_args()
+    variants: dict[str, Callable[..., list[tuple[Any, ...]]]] = {
+        "rows": EtsyDataService._prep_transaction_rows
+    }
+    try:
+        import numpy  # noqa: F401
+
+        variants["rows numpy"] = prep_columnar
+    except ImportError:
+        print("NumPy isn't installed, skipping the columnar prep.")
+    shop_id: int = 1
+    date_added: datetime = datetime.now()
+    mismatches: int = 0
+    for count in args.receipts:
+        receipts: list[dict[str, Any]] = generate_receipts(shop_id, count, seed=count)
+        # other shops' receipts are skipped
+        receipts += generate_receipts(shop_id + 1, count // 10, seed=count)
+        dicts_time, transactions = best_time(
+            lambda: prep_transaction_data(shop_id, receipts),
+            args.repeat,
+        )
+        expected: list[tuple[Any, ...]] = as_rows(shop_id, transactions, date_added)
+        print(f"receipts={count:<7} dicts        {dicts_time:.4f}s")
+        for name, prep in variants.items():
+            elapsed, rows = best_time(
+                lambda: prep(shop_id, receipts, date_added), args.repeat
+            )
+            same: bool = rows == expected and all(
+                type(a) is type(b)
+                for row, other in zip(rows, expected)
+                for a, b in zip(row, other)
+            )
+            mismatches += not same
+            print(
+                f"receipts={count:<7} {name:<12} {elapsed:.4f}s {dicts_time / elapsed:.2f}x{'' if same else ' MISMATCH'}"
+            )
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import sys
+from typing import Any
+
+from databased import Rows
+
+from benchmarks.synthetic import generate_receipts
+from benchmarks.temp_db import temp_database
+from data_service import EtsyDataService
+from db import SCDatabased
+
+# The months the export covered before its range was configurable.
+START: str = "2018-01"
+STOP: str = "2024-12"
+
+
+def get_condensed_data_by_month(db: SCDatabased) -> list[dict[str, Any]]:
+    """
+    The original export, one `SUM` query per shop per month pattern, kept as the reference output.
+
+    Returns
+    -------
+    list[dict[str, Any]]
+        The condensed data for `START` through `STOP`.
+    """
+    data: list[dict[str, Any]] = []
+    date_patterns: list[str] = [
+        f"{year}-{month:02}-%" for year in range(2018, 2025) for month in range(1, 13)
+    ]
+    shops: Rows = db.select("shops", ["shop_id"])
+    for i, shop in enumerate(shops, 1):
+        for date in date_patterns:
+            row: dict[str, Any] = {}
+            row["participant id"] = f"Artist_{i}"
+            row["date"] = EtsyDataService._convert_date(date.removesuffix("-%"))
+            sales: Rows = db.select(
+                "sales",
+                ["SUM(total_price) AS revenue", "SUM(quantity) AS sales"],
+                where=f"shop_id = {shop['shop_id']} AND sale_date LIKE '{date}'",
+            )
+            row["revenue"] = sales[0]["revenue"] if sales[0]["revenue"] else "N/A"
+            row["sales"] = sales[0]["sales"] if sales[0]["sales"] else "N/A"
+            data.append(row)
+    return data
+
+
+def main() -> None:
+    """
+    Save generated receipts for a few shops, and a shop without sales, to a fresh database,
+    then fail if `EtsyDataService.get_condensed_data()` differs from the original per month queries.
+    """
+    with temp_database("condensed.sqlite3") as db:
+        for shop_id, count in ((1, 2000), (2, 300), (3, 0), (4, 25)):
+            EtsyDataService.save_transaction_data(
+                shop_id, generate_receipts(shop_id, count, seed=shop_id)
+            )
+        with db:
+            expected: list[dict[str, Any]] = get_condensed_data_by_month(db)
+        actual: list[dict[str, Any]] = EtsyDataService.get_condensed_data(START, STOP)
+    mismatches: list[tuple[dict[str, Any], dict[str, Any]]] = [
+        (old, new) for old, new in zip(expected, actual) if old != new
+    ]
+    if len(expected) != len(actual):
+        print(f"FAIL {len(actual)} rows, expected {len(expected)}")
+    for old, new in mismatches[:10]:
+        print(f"FAIL expected {old}, got {new}")
+    if mismatches or len(expected) != len(actual):
+        sys.exit(1)
+    print(f"ok   {len(actual)} rows match the per month queries")
+
+
+if __name__ == "__main__":
+    main()
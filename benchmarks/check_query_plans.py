@@ -0,0 +1,107 @@
+import sqlite3
+import sys
+import tempfile
+from datetime import datetime
+from typing import Any
+
+from pathier import Pathier
+
+from data_service import CONDENSED_DATA_QUERY, EtsyDataService
+from db import (
+    CLAIM_PULL_JOB,
+    CONSUME_STATE,
+    LAST_SALE_QUERY,
+    MONTHLY_SALES_REFRESH,
+    PURGE_STATES,
+    REQUEUE_EXPIRED_JOBS,
+    SCDatabased,
+)
+
+# name: (query, parameters, tables the query is allowed to scan in full)
+HOT_QUERIES: dict[str, tuple[str, tuple[Any, ...], set[str]]] = {
+    "condensed export": (CONDENSED_DATA_QUERY, ("2020-01", "2020-12"), {"shops"}),
+    # scanning the (shop_id, sale_date) index is fine, it avoids sorting the whole table
+    "sales export": (
+        *EtsyDataService._get_sales_export_query(None, None, None),
+        {"sales"},
+    ),
+    "shop sales export": (
+        *EtsyDataService._get_sales_export_query(1, "2024-01", "2024-12"),
+        set(),
+    ),
+    "shop monthly aggregate": (
+        *EtsyDataService._get_aggregate_query(1, "2024-01", "2024-12", "month"),
+        set(),
+    ),
+    "shop daily aggregate": (
+        *EtsyDataService._get_aggregate_query(1, "2024-01", "2024-12", "day"),
+        set(),
+    ),
+    "monthly rollup refresh": (MONTHLY_SALES_REFRESH, (1, "2024-01"), set()),
+    "sync cursor fallback": (LAST_SALE_QUERY, (1,), set()),
+    "existing transactions": (
+        "SELECT COUNT(*) FROM sales WHERE transaction_id IN (1, 2, 3);",
+        (),
+        set(),
+    ),
+    "sync cursor": (
+        "SELECT last_created FROM sync_state WHERE shop_id = ?;",
+        (1,),
+        set(),
+    ),
+    "consume oauth state": (CONSUME_STATE, ("state", datetime.now()), set()),
+    "purge oauth states": (PURGE_STATES, (datetime.now(),), set()),
+    "claim pull job": (CLAIM_PULL_JOB, (datetime.now(),), set()),
+    "requeue expired jobs": (REQUEUE_EXPIRED_JOBS, (datetime.now(),), set()),
+    "pull job status": (
+        "SELECT status, attempts, records, error, date_added, date_updated FROM jobs WHERE state = ?;",
+        ("state",),
+        set(),
+    ),
+}
+
+
+def get_full_scans(
+    connection: sqlite3.Connection, query: str, parameters: tuple[Any, ...]
+) -> list[str]:
+    """
+    Returns
+    -------
+    list[str]
+        The tables `query` reads with a full table (or full index) scan.
+    """
+    plan: list[dict[str, Any]] = connection.execute(
+        f"EXPLAIN QUERY PLAN {query}", parameters
+    ).fetchall()
+    return [
+        row["detail"].split()[1] for row in plan if row["detail"].startswith("SCAN ")
+    ]
+
+
+def main() -> None:
+    """
+    Build an empty database from 'schema.sql' and the migrations,
+    then fail if any hot query's plan falls back to a full scan of a table it shouldn't.
+    """
+    root: Pathier = Pathier(__file__).parent.parent
+    failures: int = 0
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db: SCDatabased = SCDatabased()
+        db.path = Pathier(temp_dir) / "plans.sqlite3"
+        with db:
+            db.execute_script(root / "schema.sql")
+            db.apply_migrations(root / "migrations")
+            connection: sqlite3.Connection = db.connection  # type: ignore
+            for name, (query, parameters, allowed) in HOT_QUERIES.items():
+                scans: set[str] = set(get_full_scans(connection, query, parameters))
+                bad: set[str] = scans - allowed
+                if bad:
+                    failures += 1
+                    print(f"FAIL {name}: full scan of {', '.join(sorted(bad))}")
+                else:
+                    print(f"ok   {name}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
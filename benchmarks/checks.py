@@ -0,0 +1,56 @@
+import argparse
+import subprocess
+import sys
+import time
+
+from pathier import Pathier
+
+root: Pathier = Pathier(__file__).parent.parent
+
+# The benchmark scripts that check correctness or a budget, with arguments that keep them quick.
+# Each exits non-zero on failure.
+CHECKS: tuple[tuple[str, ...], ...] = (
+    ("benchmarks.import_time",),
+    ("benchmarks.check_query_plans",),
+    ("benchmarks.check_condensed",),
+    ("benchmarks.bench_prep", "-r", "100", "1000", "-n", "1"),
+    ("benchmarks.bench_ingest", "-p", "1", "4", "-r", "200", "-l", "0"),
+)
+
+
+def get_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Run every benchmark check from a clean checkout, e.g. in CI, and fail if any of them fail."
+    )
+    parser.add_argument(
+        "checks",
+        type=str,
+        nargs="*",
+        default=[],
+        help="Only run the checks whose module name contains one of these.",
+    )
+    return parser.parse_args()
+
+
+def main(args: argparse.Namespace | None = None) -> None:
+    args = args or get_args()
+    failed: list[str] = []
+    for module, *check_args in CHECKS:
+        if args.checks and not any(name in module for name in args.checks):
+            continue
+        print(f"== {module}", flush=True)
+        start: float = time.perf_counter()
+        process: subprocess.CompletedProcess[bytes] = subprocess.run(
+            [sys.executable, "-m", module, *check_args], cwd=root
+        )
+        status: str = "FAIL" if process.returncode else "ok"
+        print(f"{status} {module} in {time.perf_counter() - start:.1f}s\n", flush=True)
+        if process.returncode:
+            failed.append(module)
+    if failed:
+        print(f"Failed: {', '.join(failed)}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from urllib.parse import parse_qs, urlparse
+
+from etsy_python.v3.common.Env import environment  # type: ignore
+from typing_extensions import Self
+
+
+class FakeEtsyAPI:
+    """
+    Local stand-in for the Etsy API endpoints `etsy.AuthenticatedClient` calls.
+
+    Serves `/v3/application/users/me` and `/v3/application/shops/{shop_id}/receipts`
+    with an optional simulated latency per request,
+    as well as token refreshes at `/v3/public/oauth/token`.
+
+    The shop a request is for is taken from the access token,
+    so clients should be created with access and refresh tokens in the form '{shop_id}.{anything}'.
+
+    While used as a context manager, `etsy_python` requests are pointed at this server.
+    """
+
+    def __init__(
+        self,
+        receipts: dict[int, list[dict[str, Any]]],
+        latency: float = 0,
+        handshake: float = 0,
+    ) -> None:
+        """
+        Initialize the server.
+
+        Parameters
+        ----------
+        receipts : dict[int, list[dict[str, Any]]]
+            Receipts to serve keyed by shop id.
+        latency : float, optional
+            Seconds to wait before answering each request, by default 0.
+        handshake : float, optional
+            Seconds to wait when a connection is opened, standing in for a TLS handshake. By default 0.
+        """
+        self.receipts: dict[int, list[dict[str, Any]]] = receipts
+        self.latency: float = latency
+        self.handshake: float = handshake
+        self.requests: int = 0
+        self.connections: int = 0
+        self._lock: threading.Lock = threading.Lock()
+        self._server: ThreadingHTTPServer = ThreadingHTTPServer(
+            ("127.0.0.1", 0), self._get_handler()
+        )
+        self._server.daemon_threads = True
+        self._thread: threading.Thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True
+        )
+        self._request_url: str = environment.request_url
+        self._token_url: str = environment.token_url
+
+    @property
+    def url(self) -> str:
+        """The base url requests should be made to."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v3/application"
+
+    def __enter__(self) -> Self:
+        self._thread.start()
+        environment.request_url = self.url
+        environment.token_url = self.url.replace("application", "public/oauth/token")
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        environment.request_url = self._request_url
+        environment.token_url = self._token_url
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _get_handler(self) -> type[BaseHTTPRequestHandler]:
+        api: FakeEtsyAPI = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # headers and body are written separately,
+            # Nagle's algorithm would hold the body back until the client acks the headers
+            disable_nagle_algorithm = True
+
+            def setup(self) -> None:
+                super().setup()
+                with api._lock:
+                    api.connections += 1
+                time.sleep(api.handshake)
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+            def do_GET(self) -> None:
+                with api._lock:
+                    api.requests += 1
+                time.sleep(api.latency)
+                url = urlparse(self.path)
+                token: str = self.headers.get("Authorization", "").removeprefix(
+                    "Bearer "
+                )
+                shop_id: int = int(token.split(".")[0])
+                parts: list[str] = url.path.strip("/").split("/")
+                if parts[-2:] == ["users", "me"]:
+                    self.send_json({"user_id": shop_id, "shop_id": shop_id})
+                elif parts[-1] == "receipts":
+                    params: dict[str, list[str]] = parse_qs(url.query)
+                    self.send_json(api.get_receipts(int(parts[-2]), params))
+                else:
+                    self.send_json({"error": "Not found"}, 404)
+
+            def do_POST(self) -> None:
+                with api._lock:
+                    api.requests += 1
+                time.sleep(api.latency)
+                body: dict[str, Any] = json.loads(
+                    self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                )
+                shop_id: str = body["refresh_token"].split(".")[0]
+                self.send_json(
+                    {
+                        "access_token": f"{shop_id}.refreshed",
+                        "refresh_token": f"{shop_id}.refreshed",
+                        "expires_in": 3600,
+                    }
+                )
+
+            def send_json(self, data: dict[str, Any], status: int = 200) -> None:
+                body: bytes = json.dumps(data).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def get_receipts(
+        self, shop_id: int, params: dict[str, list[str]]
+    ) -> dict[str, Any]:
+        """
+        Filter, sort, and paginate a shop's receipts the way `getShopReceipts` does.
+
+        Parameters
+        ----------
+        shop_id : int
+            The shop to get receipts for.
+        params : dict[str, list[str]]
+            The parsed query string.
+
+        Returns
+        -------
+        dict[str, Any]
+            The response body with the keys 'count' and 'results'.
+        """
+        receipts: list[dict[str, Any]] = self.receipts.get(shop_id, [])
+        if "min_created" in params:
+            min_created: int = int(params["min_created"][0])
+            receipts = [r for r in receipts if r["created_timestamp"] >= min_created]
+        receipts = sorted(
+            receipts,
+            key=lambda receipt: receipt["created_timestamp"],
+            reverse=params.get("sort_order", ["desc"])[0] == "desc",
+        )
+        limit: int = int(params.get("limit", ["25"])[0])
+        offset: int = int(params.get("offset", ["0"])[0])
+        return {"count": len(receipts), "results": receipts[offset : offset + limit]}
@@ -0,0 +1,135 @@
+import argparse
+import re
+import subprocess
+import sys
+from contextlib import contextmanager
+from typing import Iterator
+
+from pathier import Pathier
+
+root: Pathier = Pathier(__file__).parent.parent
+
+# Modules that should only be imported by the routes that need them.
+LAZY_MODULES: tuple[str, ...] = (
+    "etsy",
+    "etsy_python",
+    "jobs",
+    "data_service",
+    "db",
+    "databased",
+    "loggi",
+    "metrics",
+    "writer",
+)
+
+# Written to '.env' when there isn't one, `flask_app` won't import without it
+# but importing doesn't use the values.
+STUB_ENV: str = "sc_keystring=import-time\nsc_oauth-redirect=http://localhost/\n"
+
+
+def get_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Measure how long `flask_app` takes to import with `python -X importtime` and fail if it's over budget."
+    )
+    parser.add_argument(
+        "-b",
+        "--budget",
+        type=float,
+        default=250,
+        help="The most milliseconds importing `flask_app` may take.",
+    )
+    parser.add_argument(
+        "-n",
+        "--runs",
+        type=int,
+        default=5,
+        help="Imports to time, the fastest is compared to the budget.",
+    )
+    parser.add_argument(
+        "-t",
+        "--top",
+        type=int,
+        default=10,
+        help="The number of slowest imports to show.",
+    )
+    return parser.parse_args()
+
+
+@contextmanager
+def stub_env() -> Iterator[None]:
+    """
+    Write a stub '.env' file to the repo root if there isn't one, e.g. in a clean checkout,
+    and remove it again afterwards.
+    """
+    env: Pathier = root / ".env"
+    if env.exists():
+        yield
+        return
+    env.write_text(STUB_ENV)
+    try:
+        yield
+    finally:
+        env.unlink()
+
+
+def time_import(module: str) -> dict[str, tuple[int, int]]:
+    """
+    Import `module` in a fresh interpreter.
+
+    Returns
+    -------
+    dict[str, tuple[int, int]]
+        The self and cumulative microseconds of every module imported, keyed by module name.
+    """
+    process: subprocess.CompletedProcess[str] = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=root,
+        capture_output=True,
+        text=True,
+    )
+    if process.returncode:
+        raise RuntimeError(f"Importing '{module}' failed:\n{process.stderr}")
+    times: dict[str, tuple[int, int]] = {}
+    for line in process.stderr.splitlines():
+        match: re.Match[str] | None = re.match(
+            r"import time:\s+(\d+) \|\s+(\d+) \|\s*(\S+)", line
+        )
+        if match:
+            times[match[3]] = (int(match[1]), int(match[2]))
+    return times
+
+
+def main(args: argparse.Namespace | None = None) -> None:
+    args = args or get_args()
+    with stub_env():
+        runs: list[dict[str, tuple[int, int]]] = [
+            time_import("flask_app") for _ in range(args.runs)
+        ]
+    fastest: dict[str, tuple[int, int]] = min(
+        runs, key=lambda times: times["flask_app"][1]
+    )
+    print("Slowest imports (cumulative ms):")
+    for name, (_, cumulative) in sorted(
+        fastest.items(), key=lambda item: item[1][1], reverse=True
+    )[: args.top]:
+        print(f"  {cumulative / 1000:8.1f} {name}")
+    failed: bool = False
+    eager: list[str] = [name for name in fastest if name.split(".")[0] in LAZY_MODULES]
+    if eager:
+        failed = True
+        print(f"FAIL imported at startup: {', '.join(sorted(eager))}")
+    total: float = fastest["flask_app"][1] / 1000
+    if total > args.budget:
+        failed = True
+        print(
+            f"FAIL importing flask_app took {total:.1f}ms, the budget is {args.budget}ms"
+        )
+    else:
+        print(
+            f"ok   importing flask_app took {total:.1f}ms, the budget is {args.budget}ms"
+        )
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+import argparse
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Any, Callable
+
+from pathier import Pathier
+
+import export_cache
+import ratelimit
+from benchmarks.bench_prep import prep_transaction_data
+from benchmarks.fake_etsy import FakeEtsyAPI
+from benchmarks.synthetic import generate_receipts
+from benchmarks.temp_db import temp_database
+from data_service import EtsyDataService
+from db import shared_db
+from etsy import AuthenticatedClient
+
+root: Pathier = Pathier(__file__).parent.parent
+
+
+def get_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Time the fetch, save, and export paths against synthetic data and write the results as JSON."
+    )
+    parser.add_argument(
+        "-s",
+        "--shops",
+        type=int,
+        nargs="*",
+        default=[1, 10],
+        help="Shop counts to benchmark.",
+    )
+    parser.add_argument(
+        "-r",
+        "--receipts",
+        type=int,
+        nargs="*",
+        default=[500, 5000],
+        help="History lengths, in receipts per shop, to benchmark.",
+    )
+    parser.add_argument(
+        "-l",
+        "--latency",
+        type=float,
+        default=0,
+        help="Simulated seconds of latency per request to the fake API.",
+    )
+    parser.add_argument(
+        "-n",
+        "--repeat",
+        type=int,
+        default=3,
+        help="Times to run each benchmark, the median is reported.",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        default=None,
+        help="Where to write the results. Defaults to 'benchmarks/results/{commit}.json'.",
+    )
+    parser.add_argument(
+        "-c",
+        "--compare",
+        type=str,
+        default=None,
+        help="A previous results file to compare against.",
+    )
+    parser.add_argument(
+        "-t",
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="How much slower than `--compare`, as a fraction, a benchmark can be before failing.",
+    )
+    return parser.parse_args()
+
+
+def get_commit() -> str:
+    """
+    Returns
+    -------
+    str
+        The short hash of the checked out commit, suffixed with '+dirty' if there are uncommitted changes.
+    """
+
+    def git(*args: str) -> str:
+        return subprocess.run(
+            ["git", *args], cwd=root, capture_output=True, text=True
+        ).stdout.strip()
+
+    commit: str = git("rev-parse", "--short", "HEAD") or "unknown"
+    return (
+        f"{commit}+dirty"
+        if git("status", "--porcelain", "--untracked-files=no")
+        else commit
+    )
+
+
+def time_runs(function: Callable[[], Any], repeat: int) -> list[float]:
+    """
+    Returns
+    -------
+    list[float]
+        The seconds each of `repeat` calls to `function` took.
+    """
+    runs: list[float] = []
+    for _ in range(repeat):
+        start: float = time.perf_counter()
+        function()
+        runs.append(time.perf_counter() - start)
+    return runs
+
+
+def run_scenario(
+    shops: int, receipts: int, latency: float, repeat: int
+) -> dict[str, list[float]]:
+    """
+    Benchmark every path against a fresh database and a fake API serving `shops` shops with `receipts` receipts each.
+
+    Returns
+    -------
+    dict[str, list[float]]
+        The timings of each benchmark.
+    """
+    data: dict[int, list[dict[str, Any]]] = {
+        shop_id: generate_receipts(shop_id, receipts, seed=shop_id)
+        for shop_id in range(1, shops + 1)
+    }
+    timings: dict[str, list[float]] = {}
+    with temp_database():
+
+        def fetch() -> None:
+            for shop_id in data:
+                AuthenticatedClient(
+                    {
+                        "access_token": f"{shop_id}.benchmark",
+                        "refresh_token": f"{shop_id}.benchmark",
+                        "expires_in": "3600",
+                    }
+                ).get_sales_data()
+
+        with FakeEtsyAPI(data, latency):
+            timings["get_sales_data"] = time_runs(fetch, repeat)
+
+        prepped: dict[int, list[dict[str, Any]]] = {}
+
+        def prep() -> None:
+            for shop_id, shop_receipts in data.items():
+                prepped[shop_id] = prep_transaction_data(shop_id, shop_receipts)
+
+        # named after the method it used to be so results stay comparable
+        timings["_prep_transaction_data"] = time_runs(prep, repeat)
+        timings["_prep_transaction_rows"] = time_runs(
+            lambda: [
+                EtsyDataService._prep_transaction_rows(shop_id, shop_receipts)
+                for shop_id, shop_receipts in data.items()
+            ],
+            repeat,
+        )
+
+        def save() -> None:
+            with shared_db() as db:
+                for shop_id, transactions in prepped.items():
+                    db.save_etsy_data(shop_id, transactions)
+
+        # The first run inserts, later runs update the same rows.
+        timings["save_etsy_data"] = time_runs(save, repeat)
+        timings["get_condensed_data"] = time_runs(
+            EtsyDataService.get_condensed_data, repeat
+        )
+        timings.update(time_salesdata(repeat))
+    return timings
+
+
+def time_salesdata(repeat: int) -> dict[str, list[float]]:
+    """
+    Time full `/salesdata` responses, plain and gzipped,
+    bumping the data version before each request so the export cache is never hit.
+
+    Returns
+    -------
+    dict[str, list[float]]
+        The timings of each variant, or nothing if the app can't be imported without a '.env' file.
+    """
+    if not (root / ".env").exists():
+        print("Skipping /salesdata, the app needs a '.env' file.")
+        return {}
+    from flask_app import app
+
+    client = app.test_client()
+    timings: dict[str, list[float]] = {}
+    for name, headers in (
+        ("/salesdata", {}),
+        ("/salesdata gzip", {"Accept-Encoding": "gzip"}),
+    ):
+
+        def get() -> None:
+            export_cache.bump_data_version()
+            response = client.get("/salesdata", headers=headers)
+            assert response.status_code == 200, response.status
+            response.get_data()
+
+        timings[name] = time_runs(get, repeat)
+    return timings
+
+
+def compare(
+    results: list[dict[str, Any]], baseline_path: Pathier, tolerance: float
+) -> int:
+    """
+    Print how each result compares to the same benchmark in a previous results file.
+
+    Returns
+    -------
+    int
+        The number of benchmarks more than `tolerance` slower than the baseline.
+    """
+    baseline: dict[tuple[int, int, str], float] = {
+        (result["shops"], result["receipts"], result["benchmark"]): result["median"]
+        for result in baseline_path.loads()["results"]
+    }
+    regressions: int = 0
+    for result in results:
+        key: tuple[int, int, str] = (
+            result["shops"],
+            result["receipts"],
+            result["benchmark"],
+        )
+        if key not in baseline:
+            continue
+        ratio: float = result["median"] / baseline[key]
+        slower: bool = ratio > 1 + tolerance
+        regressions += slower
+        print(
+            f"{'SLOWER' if slower else 'ok':<6} shops={key[0]:<3} receipts={key[1]:<6} {key[2]:<24} {ratio:.2f}x"
+        )
+    return regressions
+
+
+def main(args: argparse.Namespace | None = None) -> None:
+    args = args or get_args()
+    os.environ.setdefault("sc_keystring", "benchmark")
+    # Measure this code, not the client side rate limit.
+    ratelimit.BUCKET = ratelimit.TokenBucket(1_000_000, 1_000_000)
+    commit: str = get_commit()
+    results: list[dict[str, Any]] = []
+    for shops in args.shops:
+        for receipts in args.receipts:
+            timings: dict[str, list[float]] = run_scenario(
+                shops, receipts, args.latency, args.repeat
+            )
+            for benchmark, runs in timings.items():
+                median: float = statistics.median(runs)
+                results.append(
+                    {
+                        "shops": shops,
+                        "receipts": receipts,
+                        "benchmark": benchmark,
+                        "median": median,
+                        "runs": runs,
+                    }
+                )
+                print(
+                    f"shops={shops:<3} receipts={receipts:<6} {benchmark:<24} {median:.4f}s"
+                )
+    output: Pathier = (
+        Pathier(args.output)
+        if args.output
+        else Pathier(__file__).parent / "results" / f"{commit}.json"
+    )
+    output.dumps(
+        {
+            "commit": commit,
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "latency": args.latency,
+            "repeat": args.repeat,
+            "results": results,
+        },
+        indent=2,
+    )
+    print(f"Results written to '{output}'.")
+    if args.compare and compare(results, Pathier(args.compare), args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
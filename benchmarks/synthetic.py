@@ -0,0 +1,64 @@
+import random
+from typing import Any
+
+
+def generate_receipts(
+    shop_id: int,
+    count: int,
+    start: int = 1514764800,
+    stop: int = 1735689599,
+    max_transactions: int = 3,
+    seed: int | None = None,
+) -> list[dict[str, Any]]:
+    """
+    Generate receipts in the shape returned by Etsy's `getShopReceipts` endpoint,
+    limited to the fields `EtsyDataService._prep_transaction_rows()` uses.
+
+    Parameters
+    ----------
+    shop_id : int
+        The shop (seller user) the receipts belong to.
+    count : int
+        The number of receipts to generate.
+    start : int, optional
+        The earliest `created_timestamp`, by default 2018-01-01.
+    stop : int, optional
+        The latest `created_timestamp`, by default 2024-12-31.
+    max_transactions : int, optional
+        The maximum number of transactions per receipt, by default 3.
+    seed : int | None, optional
+        Seed for reproducible output, by default None.
+
+    Returns
+    -------
+    list[dict[str, Any]]
+        The receipts sorted by `created_timestamp`.
+    """
+    rng: random.Random = random.Random(seed)
+    timestamps: list[int] = sorted(rng.randint(start, stop) for _ in range(count))
+    receipts: list[dict[str, Any]] = []
+    for i, timestamp in enumerate(timestamps):
+        receipt_id: int = shop_id * 10_000_000 + i
+        receipts.append(
+            {
+                "receipt_id": receipt_id,
+                "seller_user_id": shop_id,
+                "created_timestamp": timestamp,
+                "transactions": [
+                    {
+                        "transaction_id": receipt_id * 10 + j,
+                        "title": f"Listing {rng.randint(1, 500)}",
+                        "quantity": rng.randint(1, 4),
+                        "listing_id": rng.randint(1, 500),
+                        "product_id": rng.randint(1, 5000),
+                        "price": {
+                            "amount": rng.randint(100, 20000),
+                            "divisor": rng.choice((100, 100, 100, 0)),
+                            "currency_code": "USD",
+                        },
+                    }
+                    for j in range(rng.randint(1, max_transactions))
+                ],
+            }
+        )
+    return receipts
@@ -0,0 +1,56 @@
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Iterator
+
+from pathier import Pathier
+
+import export_cache
+import writer
+from db import SCDatabased, close_shared_db
+
+root: Pathier = Pathier(__file__).parent.parent
+
+
+@contextmanager
+def temp_database(name: str = "benchmark.sqlite3") -> Iterator[SCDatabased]:
+    """
+    Point the app at a fresh database, built from 'schema.sql' and the migrations,
+    and at fresh export version files, all in a temporary directory removed after the block.
+
+    The shared connection and ingest writer are closed on the way in and out,
+    so nothing keeps using a previous database.
+
+    >>> with temp_database() as db:
+    >>>     EtsyDataService.save_transaction_data(1, receipts)
+
+    Parameters
+    ----------
+    name : str, optional
+        The database file name, by default 'benchmark.sqlite3'.
+
+    Yields
+    ------
+    SCDatabased
+        An unconnected instance for the new database.
+    """
+    version_path: Pathier = export_cache.VERSION_PATH
+    shop_versions_dir: Pathier = export_cache.SHOP_VERSIONS_DIR
+    with tempfile.TemporaryDirectory() as temp_dir:
+        os.environ["sc_db-path"] = str(Pathier(temp_dir) / name)
+        export_cache.VERSION_PATH = Pathier(temp_dir) / "data.version"
+        export_cache.SHOP_VERSIONS_DIR = Pathier(temp_dir) / "shop.versions"
+        writer.stop_writer()
+        close_shared_db()
+        try:
+            db: SCDatabased = SCDatabased()
+            with db:
+                db.execute_script(root / "schema.sql")
+                db.apply_migrations(root / "migrations")
+            yield db
+        finally:
+            writer.stop_writer()
+            close_shared_db()
+            del os.environ["sc_db-path"]
+            export_cache.VERSION_PATH = version_path
+            export_cache.SHOP_VERSIONS_DIR = shop_versions_dir
@@ -1,10 +1,80 @@
 import csv
+import io
+import json
+import zlib
+from concurrent.futures import Future
 from datetime import datetime
-from typing import Any
+from functools import partial
+from importlib.util import find_spec
+from itertools import groupby
+from operator import itemgetter
+from typing import Any, Iterable, Iterator
 
-from pathier import Pathier
+import metrics
+import writer
+from db import SCDatabased, shared_db
 
-from db import Rows, SCDatabased
+CONDENSED_DATA_QUERY: str = (
+    "SELECT shops.shop_id, year_month, revenue, sales FROM shops LEFT JOIN monthly_sales ON monthly_sales.shop_id = shops.shop_id AND year_month BETWEEN ? AND ? ORDER BY shops.shop_id, year_month;"
+)
+MONTH_SPAN_QUERY: str = (
+    "SELECT MIN(year_month) AS first_month, MAX(year_month) AS last_month FROM monthly_sales;"
+)
+# `{where}` is filled in by `EtsyDataService._get_sales_export_query()`.
+# Ordered to match the (shop_id, sale_date) index so no sort is needed.
+SALES_EXPORT_QUERY: str = (
+    "SELECT shop_id, receipt_id, transaction_id, listing_id, product_id, title, unit_price, quantity, total_price, sale_date, date_added FROM sales{where} ORDER BY shop_id, sale_date;"
+)
+
+# `{where}` is filled in by `EtsyDataService._get_aggregate_query()`.
+MONTHLY_AGGREGATE_QUERY: str = (
+    "SELECT year_month AS period, SUM(revenue) AS revenue, SUM(sales) AS sales FROM monthly_sales{where} GROUP BY period ORDER BY period;"
+)
+SALES_AGGREGATE_QUERY: str = (
+    "SELECT {period} AS period, SUM(total_price) AS revenue, SUM(quantity) AS sales FROM sales{where} GROUP BY period ORDER BY period;"
+)
+# granularity: expression giving the period a sale belongs to, weeks are labeled by the date they start on (Monday)
+SALE_PERIODS: dict[str, str] = {
+    "day": "substr(sale_date, 1, 10)",
+    "week": "date(sale_date, 'weekday 0', '-6 days')",
+}
+
+
+class _ChunkSink:
+    """
+    Write only file object that holds what's written until it's drained,
+    so `pyarrow` writers can be streamed a chunk at a time.
+    """
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+        self._position: int = 0
+        self.closed: bool = False
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        """
+        Returns
+        -------
+        bytes
+            Everything written since the last drain.
+        """
+        data: bytes = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
 
 
 class EtsyDataService:
@@ -12,33 +82,66 @@ class EtsyDataService:
     Handles processing/storing raw Etsy data and producing output in requested format.
     """
 
+    # Roughly how many bytes of csv to buffer before yielding a chunk.
+    CSV_CHUNK_SIZE: int = 64 * 1024
+    # Rows read from the database at a time by `stream_sales()`.
+    EXPORT_CHUNK_ROWS: int = 10_000
+    AGGREGATE_GRANULARITIES: tuple[str, ...] = ("month", "week", "day")
+
     @staticmethod
-    def _get_date_patterns() -> list[str]:
+    def parse_month(month: str) -> str:
         """
-        Returns a list of sql wildcard patterns for grouping transactions by month and year.
+        Validate and normalize a month given in the format 'YYYY-MM'.
+
+        Parameters
+        ----------
+        month : str
+            The month to parse.
 
         Returns
         -------
-        list[str]
-            A list of strings in the format 'YYYY-MM-%'.
+        str
+            The month in the format 'YYYY-MM'.
+
+        Raises
+        ------
+        ValueError
+            If `month` isn't a valid month in the format 'YYYY-MM'.
+        """
+        return datetime.strptime(month, "%Y-%m").strftime("%Y-%m")
+
+    @staticmethod
+    def _iter_months(start: str, stop: str) -> Iterator[str]:
+        """
+        Lazily generate every month from `start` to `stop`, inclusive.
+
+        Parameters
+        ----------
+        start : str
+            The first month in the format 'YYYY-MM'.
+        stop : str
+            The last month in the format 'YYYY-MM'.
+
+        Yields
+        ------
+        str
+            Months in the format 'YYYY-MM'.
         """
-        dates: list[str] = []
-        start: int = 2018
-        stop: int = 2024
-        for year in range(start, stop + 1):
-            for month in range(1, 13):
-                dates.append(f"{year}-{'0' if month < 10 else ''}{month}-%")
-        return dates
+        year, month = (int(part) for part in start.split("-"))
+        stop_year, stop_month = (int(part) for part in stop.split("-"))
+        while (year, month) <= (stop_year, stop_month):
+            yield f"{year}-{month:02d}"
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
 
     @staticmethod
     def _convert_date(date: str) -> str:
         """
-        Convert the given date pattern to the requested format.
+        Convert the given month to the requested format.
 
         Parameters
         ----------
         date : str
-            A date pattern in the format 'YYYY-MM-%'.
+            A month in the format 'YYYY-MM'.
 
         Returns
         -------
@@ -51,11 +154,16 @@ class EtsyDataService:
         return f"{month.removeprefix('0')}/{year[2:]}"
 
     @staticmethod
-    def _prep_transaction_data(
-        shop_id: int, data: list[dict[str, Any]]
-    ) -> list[dict[str, Any]]:
+    @metrics.PREP_SECONDS.time()
+    def _prep_transaction_rows(
+        shop_id: int, data: list[dict[str, Any]], date_added: datetime | None = None
+    ) -> list[tuple[Any, ...]]:
         """
-        Convert data returned from Etsy's API to database schema compatible format.
+        Convert data returned from Etsy's API to rows for `SCDatabased.save_sales_rows()`.
+
+        Converts each receipt's timestamp once instead of once per transaction
+        and builds tuples `executemany()` can use directly instead of dicts.
+        `benchmarks/bench_prep.py` checks it against the original dict based prep.
 
         Parameters
         ----------
@@ -63,99 +171,533 @@ class EtsyDataService:
             The shop id the given data is for.
         data : list[dict[str, Any]]
             The raw transaction data taken from the Etsy API.
+        date_added : datetime | None, optional
+            The `date_added` value for the rows, by default the current time.
 
         Returns
         -------
-        list[dict[str, Any]]
-            The transaction data prepped for database storage.
+        list[tuple[Any, ...]]
+            The transaction data as `db.SALES_UPSERT` parameters.
         """
-        transactions: list[dict[str, Any]] = []
+        date_added = date_added or datetime.now()
+        rows: list[tuple[Any, ...]] = []
         for receipt in data:
             if receipt["seller_user_id"] == shop_id:
+                sale_date: datetime = datetime.fromtimestamp(
+                    receipt["created_timestamp"]
+                )
                 for transaction in receipt["transactions"]:
-                    prepped: dict[str, Any] = {}
-                    prepped["receipt_id"] = receipt["receipt_id"]
-                    prepped["sale_date"] = datetime.fromtimestamp(
-                        receipt["created_timestamp"]
+                    divisor: int = transaction["price"]["divisor"]
+                    unit_price: float = float(transaction["price"]["amount"]) / (
+                        1.0 if divisor == 0 else divisor
                     )
-                    prepped["transaction_id"] = transaction["transaction_id"]
-                    prepped["title"] = transaction["title"]
-                    prepped["quantity"] = transaction["quantity"]
-                    prepped["listing_id"] = transaction["listing_id"]
-                    prepped["product_id"] = transaction["product_id"]
-                    prepped["unit_price"] = float(transaction["price"]["amount"]) / (
-                        1.0
-                        if transaction["price"]["divisor"] == 0
-                        else transaction["price"]["divisor"]
+                    rows.append(
+                        (
+                            transaction["listing_id"],
+                            transaction["product_id"],
+                            receipt["receipt_id"],
+                            transaction["transaction_id"],
+                            shop_id,
+                            transaction["title"],
+                            unit_price,
+                            transaction["quantity"],
+                            unit_price * transaction["quantity"],
+                            sale_date,
+                            date_added,
+                        )
                     )
-                    prepped["total_price"] = prepped["unit_price"] * prepped["quantity"]
-                    transactions.append(prepped)
-        return transactions
+        return rows
 
     @staticmethod
-    def save_transaction_data(shop_id: int, data: list[dict[str, Any]]) -> None:
+    def save_page(
+        db: SCDatabased, shop_id: int, data: list[dict[str, Any]]
+    ) -> tuple[int, int]:
         """
-        Save transaction data taken from the Etsy API to the database.
+        Save a page of transaction data taken from the Etsy API
+        and advance the shop's sync cursor to the newest receipt in `data`.
 
         Parameters
         ----------
+        db : SCDatabased
+            The database connection to save with.
         shop_id : int
             The shop id the given data is for.
         data : list[dict[str, Any]]
             The raw transaction data taken from the Etsy API response.
+
+        Returns
+        -------
+        tuple[int, int]
+            The number of inserted and updated transactions.
+        """
+        rows: list[tuple[Any, ...]] = EtsyDataService._prep_transaction_rows(
+            shop_id, data
+        )
+        counts: tuple[int, int] = db.save_sales_rows(shop_id, rows)
+        if data:
+            latest: dict[str, Any] = max(data, key=itemgetter("created_timestamp"))
+            db.update_sync_state(
+                shop_id, latest["created_timestamp"], latest["receipt_id"]
+            )
+        return counts
+
+    @staticmethod
+    def save_transaction_pages(
+        shop_id: int, pages: Iterable[list[dict[str, Any]]]
+    ) -> tuple[int, int, int]:
         """
-        data = EtsyDataService._prep_transaction_data(shop_id, data)
-        with SCDatabased() as db:
-            db.save_etsy_data(shop_id, data)
+        Submit pages of transaction data taken from the Etsy API to the ingest writer as they're produced
+        and wait for them to be committed.
+
+        The writer groups pages from every pull in the process into shared transactions.
+        Each page depends on the one before it, so pages after a failed one aren't saved.
+        Pages should be in ascending order of creation
+        so the shop's sync cursor never skips past receipts that haven't been saved.
+
+        Parameters
+        ----------
+        shop_id : int
+            The shop id the given data is for.
+        pages : Iterable[list[dict[str, Any]]]
+            Pages of raw transaction data taken from the Etsy API responses.
+
+        Returns
+        -------
+        tuple[int, int, int]
+            The number of receipts saved and the number of inserted and updated transactions.
+
+        Raises
+        ------
+        Exception
+            The error of the first page that failed to save.
+        """
+        ingest: writer.IngestWriter = writer.get_writer()
+        submitted: list[tuple[int, Future[tuple[int, int]]]] = []
+        previous: Future[tuple[int, int]] | None = None
+        for page in pages:
+            # stop fetching once a page has failed, nothing after it would be saved
+            if previous is not None and previous.done() and previous.exception():
+                break
+            previous = ingest.submit(
+                partial(EtsyDataService.save_page, shop_id=shop_id, data=page),
+                shop_id,
+                previous,
+            )
+            submitted.append((len(page), previous))
+        receipts: int = 0
+        inserted: int = 0
+        updated: int = 0
+        for size, future in submitted:
+            page_inserted, page_updated = future.result()
+            receipts += size
+            inserted += page_inserted
+            updated += page_updated
+        return receipts, inserted, updated
 
     @staticmethod
-    def get_condensed_data() -> list[dict[str, Any]]:
+    def save_transaction_data(
+        shop_id: int, data: list[dict[str, Any]]
+    ) -> tuple[int, int]:
         """
+        Save transaction data taken from the Etsy API to the database through the ingest writer
+        and advance the shop's sync cursor to the newest receipt in `data`.
+
+        Parameters
+        ----------
+        shop_id : int
+            The shop id the given data is for.
+        data : list[dict[str, Any]]
+            The raw transaction data taken from the Etsy API response.
+
         Returns
         -------
-        list[dict[str, Any]]
-            The data stored in the database in the condensed format requested by researcher.
+        tuple[int, int]
+            The number of inserted and updated transactions.
+        """
+        return (
+            writer.get_writer()
+            .submit(
+                partial(EtsyDataService.save_page, shop_id=shop_id, data=data), shop_id
+            )
+            .result()
+        )
+
+    @staticmethod
+    def iter_condensed_data(
+        start: str | None = None, stop: str | None = None
+    ) -> Iterator[dict[str, Any]]:
+        """
+        Stream the condensed data one shop at a time from the `monthly_sales` rollup.
+
+        Parameters
+        ----------
+        start : str | None, optional
+            The first month to include in the format 'YYYY-MM'.
+            Defaults to the earliest month with stored sales.
+        stop : str | None, optional
+            The last month to include in the format 'YYYY-MM'.
+            Defaults to the latest month with stored sales.
+
+        Yields
+        ------
+        dict[str, Any]
+            A row of the data in the condensed format requested by researcher.
         """
-        data: list[dict[str, Any]] = []
-        date_patterns: list[str] = EtsyDataService._get_date_patterns()
-        with SCDatabased() as db:
-            shops: Rows = db.select("shops", ["shop_id"])
-            for i, shop in enumerate(shops, 1):
-                for date in date_patterns:
+        with shared_db() as db:
+            if start is None or stop is None:
+                span: dict[str, Any] = db.query(MONTH_SPAN_QUERY)[0]
+                start = start or span["first_month"]
+                stop = stop or span["last_month"]
+                # no sales stored
+                if start is None or stop is None:
+                    return
+            rows: Iterator[dict[str, Any]] = db.iter_query(
+                CONDENSED_DATA_QUERY, (start, stop)
+            )
+            for i, (_, shop_rows) in enumerate(
+                groupby(rows, key=itemgetter("shop_id")), 1
+            ):
+                totals: dict[str, dict[str, Any]] = {
+                    row["year_month"]: row for row in shop_rows
+                }
+                for date in EtsyDataService._iter_months(start, stop):
                     row: dict[str, Any] = {}
                     row["participant id"] = f"Artist_{i}"
                     row["date"] = EtsyDataService._convert_date(date)
-                    sales: Rows = db.select(
-                        "sales",
-                        ["SUM(total_price) AS revenue", "SUM(quantity) AS sales"],
-                        where=f"shop_id = {shop['shop_id']} AND sale_date LIKE '{date}'",
-                    )
-                    row["revenue"] = (
-                        sales[0]["revenue"] if sales[0]["revenue"] else "N/A"
-                    )
-                    row["sales"] = sales[0]["sales"] if sales[0]["sales"] else "N/A"
-                    data.append(row)
-        return data
+                    sales: dict[str, Any] = totals.get(date, {})
+                    row["revenue"] = sales["revenue"] if sales.get("revenue") else "N/A"
+                    row["sales"] = sales["sales"] if sales.get("sales") else "N/A"
+                    yield row
+
+    @staticmethod
+    def get_condensed_data(
+        start: str | None = None, stop: str | None = None
+    ) -> list[dict[str, Any]]:
+        """
+        Parameters
+        ----------
+        start : str | None, optional
+            The first month to include in the format 'YYYY-MM'.
+            Defaults to the earliest month with stored sales.
+        stop : str | None, optional
+            The last month to include in the format 'YYYY-MM'.
+            Defaults to the latest month with stored sales.
+
+        Returns
+        -------
+        list[dict[str, Any]]
+            The data stored in the database in the condensed format requested by researcher.
+        """
+        return list(EtsyDataService.iter_condensed_data(start, stop))
 
     @staticmethod
-    def write_data_to_csv() -> Pathier:
+    def stream_csv(
+        compress: bool = False, start: str | None = None, stop: str | None = None
+    ) -> Iterator[bytes]:
         """
-        Write data to a csv file.
+        Stream the condensed data as csv without materializing it in memory or on disk.
 
+        Parameters
+        ----------
+        compress : bool, optional
+            Whether to gzip the output, by default False.
+        start : str | None, optional
+            The first month to include in the format 'YYYY-MM'.
+            Defaults to the earliest month with stored sales.
+        stop : str | None, optional
+            The last month to include in the format 'YYYY-MM'.
+            Defaults to the latest month with stored sales.
+
+        Yields
+        ------
+        bytes
+            Chunks of csv (or gzipped csv) content.
+        """
+        buffer: io.StringIO = io.StringIO()
+        csv_writer: csv.DictWriter[str] | None = None
+        compressor = zlib.compressobj(wbits=31) if compress else None
+
+        def drain() -> bytes:
+            chunk: bytes = buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            return compressor.compress(chunk) if compressor else chunk
+
+        for row in EtsyDataService.iter_condensed_data(start, stop):
+            if csv_writer is None:
+                csv_writer = csv.DictWriter(buffer, fieldnames=row.keys())
+                csv_writer.writeheader()
+            csv_writer.writerow(row)
+            if buffer.tell() >= EtsyDataService.CSV_CHUNK_SIZE:
+                yield drain()
+        chunk: bytes = drain()
+        if compressor:
+            chunk += compressor.flush()
+        if chunk:
+            yield chunk
+
+    @staticmethod
+    def get_export_formats() -> list[str]:
+        """
         Returns
         -------
-        Pathier
-            The path to the csv file.
-        """
-        data: list[dict[str, Any]] = EtsyDataService.get_condensed_data()
-        output_path: Pathier = Pathier(__file__).parent / "etsy-sales.csv"
-        if not data:
-            output_path.touch()
-            return output_path
-        with output_path.open("w", newline="", encoding="utf-8") as file:
-            writer: csv.DictWriter[str] = csv.DictWriter(
-                file, fieldnames=data[0].keys()
+        list[str]
+            The formats `stream_sales()` can produce, 'parquet' and 'arrow' need `pyarrow` installed.
+        """
+        formats: list[str] = ["ndjson"]
+        if find_spec("pyarrow") is not None:
+            formats += ["parquet", "arrow"]
+        return formats
+
+    @staticmethod
+    def _get_sales_filter(
+        shop_id: int | None, start: str | None, stop: str | None, monthly: bool = False
+    ) -> tuple[str, tuple[Any, ...]]:
+        """
+        Build a `WHERE` clause limiting sales to a shop and range of months.
+
+        Parameters
+        ----------
+        shop_id : int | None
+            Only include this shop's sales.
+        start : str | None
+            Only include sales in or after this month, in the format 'YYYY-MM'.
+        stop : str | None
+            Only include sales in or before this month, in the format 'YYYY-MM'.
+        monthly : bool, optional
+            Whether the clause is for the `monthly_sales` table instead of `sales`, by default False.
+
+        Returns
+        -------
+        tuple[str, tuple[Any, ...]]
+            The clause, empty if there's nothing to filter on, and its parameters.
+        """
+        clauses: list[str] = []
+        parameters: list[Any] = []
+        if shop_id is not None:
+            clauses.append("shop_id = ?")
+            parameters.append(shop_id)
+        if monthly:
+            if start is not None:
+                clauses.append("year_month >= ?")
+                parameters.append(start)
+            if stop is not None:
+                clauses.append("year_month <= ?")
+                parameters.append(stop)
+        else:
+            # `sale_date` is stored as 'YYYY-MM-DD HH:MM:SS' so months compare as prefixes
+            if start is not None:
+                clauses.append("sale_date >= ?")
+                parameters.append(start)
+            if stop is not None:
+                year, month = (int(part) for part in stop.split("-"))
+                clauses.append("sale_date < ?")
+                parameters.append(f"{year + month // 12}-{month % 12 + 1:02d}")
+        where: str = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        return where, tuple(parameters)
+
+    @staticmethod
+    def _get_sales_export_query(
+        shop_id: int | None, start: str | None, stop: str | None
+    ) -> tuple[str, tuple[Any, ...]]:
+        """
+        Parameters
+        ----------
+        shop_id : int | None
+            Only include this shop's sales.
+        start : str | None
+            Only include sales in or after this month, in the format 'YYYY-MM'.
+        stop : str | None
+            Only include sales in or before this month, in the format 'YYYY-MM'.
+
+        Returns
+        -------
+        tuple[str, tuple[Any, ...]]
+            The query and its parameters.
+        """
+        where, parameters = EtsyDataService._get_sales_filter(shop_id, start, stop)
+        return SALES_EXPORT_QUERY.format(where=where), parameters
+
+    @staticmethod
+    def iter_sales_chunks(
+        shop_id: int | None = None, start: str | None = None, stop: str | None = None
+    ) -> Iterator[list[dict[str, Any]]]:
+        """
+        Stream rows of the `sales` table `EXPORT_CHUNK_ROWS` at a time.
+
+        Parameters
+        ----------
+        shop_id : int | None, optional
+            Only include this shop's sales, by default every shop's.
+        start : str | None, optional
+            Only include sales in or after this month, in the format 'YYYY-MM'.
+        stop : str | None, optional
+            Only include sales in or before this month, in the format 'YYYY-MM'.
+
+        Yields
+        ------
+        list[dict[str, Any]]
+            Chunks of sales ordered by shop and sale date.
+        """
+        query, parameters = EtsyDataService._get_sales_export_query(
+            shop_id, start, stop
+        )
+        with shared_db() as db:
+            yield from db.iter_query_chunks(
+                query, parameters, EtsyDataService.EXPORT_CHUNK_ROWS
             )
-            writer.writeheader()
-            writer.writerows(data)
-        return output_path
+
+    @staticmethod
+    def stream_sales(
+        format_: str,
+        shop_id: int | None = None,
+        start: str | None = None,
+        stop: str | None = None,
+    ) -> Iterator[bytes]:
+        """
+        Stream the `sales` table as a file, one chunk of rows at a time.
+
+        Formats:
+            * ndjson: gzipped newline delimited json
+            * parquet: zstd compressed parquet with a row group per chunk
+            * arrow: zstd compressed arrow ipc stream with a record batch per chunk
+
+        Parameters
+        ----------
+        format_ : str
+            One of `get_export_formats()`.
+        shop_id : int | None, optional
+            Only include this shop's sales, by default every shop's.
+        start : str | None, optional
+            Only include sales in or after this month, in the format 'YYYY-MM'.
+        stop : str | None, optional
+            Only include sales in or before this month, in the format 'YYYY-MM'.
+
+        Yields
+        ------
+        bytes
+            Chunks of the file.
+
+        Raises
+        ------
+        ValueError
+            If `format_` isn't available.
+        """
+        if format_ not in EtsyDataService.get_export_formats():
+            raise ValueError(f"Unsupported export format '{format_}'.")
+        chunks: Iterator[list[dict[str, Any]]] = EtsyDataService.iter_sales_chunks(
+            shop_id, start, stop
+        )
+        if format_ == "ndjson":
+            compressor = zlib.compressobj(wbits=31)
+            for rows in chunks:
+                lines: str = "".join(
+                    json.dumps(row, default=datetime.isoformat) + "\n" for row in rows
+                )
+                yield compressor.compress(lines.encode("utf-8"))
+            yield compressor.flush()
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = pa.schema(
+            [
+                ("shop_id", pa.int64()),
+                ("receipt_id", pa.int64()),
+                ("transaction_id", pa.int64()),
+                ("listing_id", pa.int64()),
+                ("product_id", pa.int64()),
+                ("title", pa.string()),
+                ("unit_price", pa.float64()),
+                ("quantity", pa.int64()),
+                ("total_price", pa.float64()),
+                ("sale_date", pa.timestamp("us")),
+                ("date_added", pa.timestamp("us")),
+            ]
+        )
+        sink: _ChunkSink = _ChunkSink()
+        table_writer = (
+            pq.ParquetWriter(sink, schema, compression="zstd")
+            if format_ == "parquet"
+            else pa.ipc.new_stream(
+                sink, schema, options=pa.ipc.IpcWriteOptions(compression="zstd")
+            )
+        )
+        with table_writer:
+            for rows in chunks:
+                table_writer.write_table(pa.Table.from_pylist(rows, schema))
+                yield sink.drain()
+        yield sink.drain()
+
+    @staticmethod
+    def _get_aggregate_query(
+        shop_id: int | None, start: str | None, stop: str | None, granularity: str
+    ) -> tuple[str, tuple[Any, ...]]:
+        """
+        Parameters
+        ----------
+        shop_id : int | None
+            Only include this shop's sales.
+        start : str | None
+            Only include sales in or after this month, in the format 'YYYY-MM'.
+        stop : str | None
+            Only include sales in or before this month, in the format 'YYYY-MM'.
+        granularity : str
+            'month', 'week', or 'day'.
+
+        Returns
+        -------
+        tuple[str, tuple[Any, ...]]
+            The query and its parameters.
+        """
+        # months come from the rollup, shorter periods from the sales themselves
+        monthly: bool = granularity == "month"
+        where, parameters = EtsyDataService._get_sales_filter(
+            shop_id, start, stop, monthly
+        )
+        if monthly:
+            return MONTHLY_AGGREGATE_QUERY.format(where=where), parameters
+        return (
+            SALES_AGGREGATE_QUERY.format(period=SALE_PERIODS[granularity], where=where),
+            parameters,
+        )
+
+    @staticmethod
+    def get_sales_aggregate(
+        shop_id: int | None = None,
+        start: str | None = None,
+        stop: str | None = None,
+        granularity: str = "month",
+    ) -> list[dict[str, Any]]:
+        """
+        Total revenue and sales per period.
+
+        Parameters
+        ----------
+        shop_id : int | None, optional
+            Only include this shop's sales, by default every shop's.
+        start : str | None, optional
+            Only include sales in or after this month, in the format 'YYYY-MM'.
+        stop : str | None, optional
+            Only include sales in or before this month, in the format 'YYYY-MM'.
+        granularity : str, optional
+            One of `AGGREGATE_GRANULARITIES`, by default 'month'.
+            Weeks start on Monday and are labeled by that date.
+
+        Returns
+        -------
+        list[dict[str, Any]]
+            The periods with sales, in order, with the keys 'period', 'revenue', and 'sales'.
+
+        Raises
+        ------
+        ValueError
+            If `granularity` isn't supported.
+        """
+        if granularity not in EtsyDataService.AGGREGATE_GRANULARITIES:
+            raise ValueError(f"Unsupported granularity '{granularity}'.")
+        query, parameters = EtsyDataService._get_aggregate_query(
+            shop_id, start, stop, granularity
+        )
+        with shared_db() as db:
+            return db.query(query, parameters)
@@ -1,11 +1,80 @@
-from datetime import datetime
-from typing import Any
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, Iterator, Sequence, cast
 
+import loggi
 from databased import Databased, Rows
 from pathier import Pathier
 
+import metrics
 from exceptions import MissingSessionDataException
 
+# `date_added` is left alone on conflict so it keeps recording when a transaction was first seen.
+# So are `shop_id` and `sale_date`, a transaction never moves shop or month,
+# and moving it would leave the month it left stale in the `monthly_sales` rollup.
+SALES_UPSERT: str = (
+    "INSERT INTO sales (listing_id, product_id, receipt_id, transaction_id, shop_id, title, unit_price, quantity, total_price, sale_date, date_added) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT (transaction_id) DO UPDATE SET listing_id = excluded.listing_id, product_id = excluded.product_id, receipt_id = excluded.receipt_id, title = excluded.title, unit_price = excluded.unit_price, quantity = excluded.quantity, total_price = excluded.total_price;"
+)
+
+# Range filter on `sale_date` so the (shop_id, sale_date) index can serve it.
+MONTHLY_SALES_REFRESH: str = (
+    "INSERT OR REPLACE INTO monthly_sales (shop_id, year_month, revenue, sales) SELECT shop_id, substr(sale_date, 1, 7) AS year_month, SUM(total_price), SUM(quantity) FROM sales WHERE shop_id = ? AND sale_date >= ? GROUP BY shop_id, year_month;"
+)
+LAST_SALE_QUERY: str = (
+    'SELECT MAX(sale_date) AS "last_sale [timestamp]" FROM sales WHERE shop_id = ?;'
+)
+CLAIM_PULL_JOB: str = (
+    "UPDATE jobs SET status = 'running', date_updated = ? WHERE job_id = (SELECT job_id FROM jobs WHERE status = 'queued' ORDER BY job_id LIMIT 1) RETURNING job_id, state, code, code_verifier, shop_id, attempts;"
+)
+# How long a claimed job can go without its worker renewing the lease before it's requeued,
+# e.g. because the worker was stopped part way through.
+JOB_LEASE: timedelta = timedelta(minutes=5)
+REQUEUE_EXPIRED_JOBS: str = (
+    "UPDATE jobs SET status = 'queued' WHERE status IN ('running', 'retrying') AND date_updated < ?;"
+)
+
+# How long an OAuth state stays valid after `/authurl` generates it.
+STATE_TTL: timedelta = timedelta(hours=1)
+CONSUME_STATE: str = (
+    "DELETE FROM states WHERE state = ? AND date_added >= ? RETURNING state, code_verifier;"
+)
+PURGE_STATES: str = "DELETE FROM states WHERE date_added < ?;"
+
+# Applied to every new connection.
+# WAL lets readers and the ingest writer work concurrently without blocking each other.
+PRAGMAS: tuple[str, ...] = (
+    "PRAGMA journal_mode = WAL;",
+    "PRAGMA synchronous = NORMAL;",
+    "PRAGMA cache_size = -16000;",
+    "PRAGMA mmap_size = 268435456;",
+)
+
+
+def get_logger() -> loggi.Logger:
+    """
+    Returns
+    -------
+    loggi.Logger
+        A database logger.
+    """
+    return loggi.getLogger("db", Pathier(__file__).parent / "logs")
+
+
+def _statement_type(query: str) -> str:
+    """
+    Returns
+    -------
+    str
+        The lowercased first keyword of `query`, e.g. 'select' or 'insert'.
+    """
+    words: list[str] = query.split(maxsplit=1)
+    return words[0].lower() if words else ""
+
 
 class SCDatabased(Databased):
     """
@@ -15,29 +84,112 @@ class SCDatabased(Databased):
     def __init__(self) -> None:
         """
         Initialize the database.
+
+        The database file can be moved from the default 'sc.sqlite3' with the `sc_db-path` environment variable.
+        """
+        super().__init__(
+            os.getenv("sc_db-path") or Pathier(__file__).parent / "sc.sqlite3",
+            connection_timeout=30,
+        )
+
+    def connect(self) -> None:
+        """
+        Connect to the database and apply `PRAGMAS`.
         """
-        super().__init__(Pathier(__file__).parent / "sc.sqlite3", connection_timeout=30)
+        super().connect()
+        for pragma in PRAGMAS:
+            self.query(pragma)
 
-    def state_exists(self, state: str) -> bool:
+    def query(self, query_: str, parameters: Sequence[Any] = ()) -> Rows:
         """
-        Checks whether a given state exists in the database.
+        Execute a query and return the results, recording how long it took in `metrics.DB_SECONDS`.
 
         Parameters
         ----------
-        state : str
-            The state string to check for.
+        query_ : str
+            The query to execute.
+        parameters : Sequence[Any], optional
+            Query parameters, by default ().
 
         Returns
         -------
-        bool
-            Whether it exists or not.
+        Rows
+            The result rows.
         """
-        return self.count("states", where=f"state = '{state}'") > 0
+        with metrics.DB_SECONDS.time(statement=_statement_type(query_)):
+            return super().query(query_, parameters)
+
+    def iter_query(
+        self, query_: str, parameters: Sequence[Any] = ()
+    ) -> Iterator[dict[str, Any]]:
+        """
+        Execute a query and yield result rows straight from the cursor
+        instead of fetching them all into memory.
+
+        Parameters
+        ----------
+        query_ : str
+            The query to execute.
+        parameters : Sequence[Any], optional
+            Query parameters, by default ().
+
+        Yields
+        ------
+        dict[str, Any]
+            Result rows.
+        """
+        if not self.connected:
+            self.connect()
+        # only times the query up to its first row, the rest is read as it's consumed
+        with metrics.DB_SECONDS.time(statement=_statement_type(query_)):
+            cursor: sqlite3.Cursor = cast(sqlite3.Connection, self.connection).execute(
+                query_, parameters
+            )
+        try:
+            yield from cursor
+        finally:
+            cursor.close()
+
+    def iter_query_chunks(
+        self, query_: str, parameters: Sequence[Any] = (), size: int = 10_000
+    ) -> Iterator[list[dict[str, Any]]]:
+        """
+        Execute a query and yield result rows `size` at a time with `fetchmany()`,
+        so memory use is bounded by `size` regardless of how many rows the query returns.
+
+        Parameters
+        ----------
+        query_ : str
+            The query to execute.
+        parameters : Sequence[Any], optional
+            Query parameters, by default ().
+        size : int, optional
+            The number of rows per chunk, by default 10_000.
+
+        Yields
+        ------
+        list[dict[str, Any]]
+            Chunks of result rows.
+        """
+        if not self.connected:
+            self.connect()
+        with metrics.DB_SECONDS.time(statement=_statement_type(query_)):
+            cursor: sqlite3.Cursor = cast(sqlite3.Connection, self.connection).execute(
+                query_, parameters
+            )
+        try:
+            while rows := cursor.fetchmany(size):
+                yield rows
+        finally:
+            cursor.close()
 
     def register_oauth(self, state: str, code_verifier: str) -> None:
         """
         Store oauth details in the database.
 
+        States older than `STATE_TTL` are purged at the same time,
+        so the table only ever holds recent authorization attempts.
+
         Parameters
         ----------
         state : str
@@ -45,15 +197,19 @@ class SCDatabased(Databased):
         code_verifier : str
             The code verifier used for the OAuth instance.
         """
+        now: datetime = datetime.now()
+        self.query(PURGE_STATES, (now - STATE_TTL,))
         self.insert(
             "states",
             ["state", "code_verifier", "date_added"],
-            [[state, code_verifier, datetime.now()]],
+            [[state, code_verifier, now]],
         )
 
     def get_oauth(self, state: str) -> dict[str, str]:
         """
-        Get the OAuth details associated with the given state.
+        Get and consume the OAuth details associated with the given state.
+
+        A state can only be retrieved once.
 
         Parameters
         ----------
@@ -68,18 +224,21 @@ class SCDatabased(Databased):
         Raises
         ------
         MissingSessionDataException
-            If there's no database entry matching `state`.
+            If there's no unexpired database entry matching `state`.
         """
-        if not self.state_exists(state):
+        rows: Rows = self.query(CONSUME_STATE, (state, datetime.now() - STATE_TTL))
+        if not rows:
             raise MissingSessionDataException()
-        rows: Rows = self.select(
-            "states", ["state", "code_verifier"], where=f"state = '{state}'"
-        )
         return rows[0]
 
-    def save_etsy_data(self, shop_id: int, transactions: list[dict[str, Any]]) -> None:
+    def save_etsy_data(
+        self, shop_id: int, transactions: list[dict[str, Any]]
+    ) -> tuple[int, int]:
         """
-        Save Etsy transaction data to the database.
+        Upsert Etsy transaction data into the database, keyed on `transaction_id`,
+        and update the `monthly_sales` rollup for the affected months.
+
+        Saving the same transactions more than once updates the existing rows instead of duplicating them.
 
         Parameters
         ----------
@@ -98,27 +257,17 @@ class SCDatabased(Databased):
                 * total_price
                 * sale_date
                 * date_added
+
+        Returns
+        -------
+        tuple[int, int]
+            The number of inserted and updated transactions.
         """
         date_added: datetime = datetime.now()
-        if not self.count("shops", where=f"shop_id = {shop_id}"):
-            self.insert("shops", ["shop_id", "date_added"], [[shop_id, date_added]])
-        self.insert(
-            "sales",
-            [
-                "listing_id",
-                "product_id",
-                "receipt_id",
-                "transaction_id",
-                "shop_id",
-                "title",
-                "unit_price",
-                "quantity",
-                "total_price",
-                "sale_date",
-                "date_added",
-            ],
+        return self.save_sales_rows(
+            shop_id,
             [
-                [
+                (
                     transaction["listing_id"],
                     transaction["product_id"],
                     transaction["receipt_id"],
@@ -130,7 +279,376 @@ class SCDatabased(Databased):
                     transaction["total_price"],
                     transaction["sale_date"],
                     date_added,
-                ]
+                )
                 for transaction in transactions
             ],
         )
+
+    def save_sales_rows(
+        self, shop_id: int, rows: list[tuple[Any, ...]]
+    ) -> tuple[int, int]:
+        """
+        Upsert rows of transaction data into the database, keyed on `transaction_id`,
+        and update the `monthly_sales` rollup for the affected months.
+
+        Parameters
+        ----------
+        shop_id : int
+            The shop id associated with the rows.
+        rows : list[tuple[Any, ...]]
+            `SALES_UPSERT` parameters, as produced by `EtsyDataService._prep_transaction_rows()`:
+            listing_id, product_id, receipt_id, transaction_id, shop_id,
+            title, unit_price, quantity, total_price, sale_date, and date_added.
+
+        Returns
+        -------
+        tuple[int, int]
+            The number of inserted and updated transactions.
+        """
+        if not self.count("shops", where=f"shop_id = {shop_id}"):
+            self.insert("shops", ["shop_id", "date_added"], [[shop_id, datetime.now()]])
+        if not rows:
+            return 0, 0
+        transaction_ids: list[int] = list({row[3] for row in rows})
+        existing: int = 0
+        first_month: str = min(row[9] for row in rows).strftime("%Y-%m")
+        # stay under sqlite's limit on the number of query parameters
+        for i in range(0, len(transaction_ids), 900):
+            chunk: list[int] = transaction_ids[i : i + 900]
+            stored: dict[str, Any] = self.query(
+                f'SELECT COUNT(*) AS count, MIN(sale_date) AS "first_sale [timestamp]" FROM sales WHERE transaction_id IN ({", ".join("?" * len(chunk))});',
+                chunk,
+            )[0]
+            existing += stored["count"]
+            # updated rows keep their stored `sale_date`, which may be earlier than the one sent
+            if stored["first_sale"]:
+                first_month = min(first_month, stored["first_sale"].strftime("%Y-%m"))
+        with metrics.DB_SECONDS.time(statement="insert"):
+            cast(sqlite3.Connection, self.connection).executemany(SALES_UPSERT, rows)
+        self.refresh_monthly_sales(shop_id, first_month)
+        inserted: int = len(transaction_ids) - existing
+        return inserted, len(rows) - inserted
+
+    def apply_migrations(self, migrations_dir: Pathier) -> list[str]:
+        """
+        Apply, in order, any migration scripts in `migrations_dir` newer than the database's `user_version`.
+
+        Scripts should be named '{version}_{description}.sql'.
+        Each one runs in its own transaction together with bumping `user_version`.
+
+        Parameters
+        ----------
+        migrations_dir : Pathier
+            The directory containing the migration scripts.
+
+        Returns
+        -------
+        list[str]
+            The names of the applied scripts.
+        """
+        current: int = self.query("PRAGMA user_version;")[0]["user_version"]
+        applied: list[str] = []
+        for path in sorted(
+            migrations_dir.glob("*.sql"), key=lambda path: int(path.stem.split("_")[0])
+        ):
+            version: int = int(path.stem.split("_")[0])
+            if version <= current:
+                continue
+            connection: sqlite3.Connection = cast(sqlite3.Connection, self.connection)
+            try:
+                connection.executescript(
+                    f"BEGIN;\n{path.read_text(encoding='utf-8')}\nPRAGMA user_version = {version};\nCOMMIT;"
+                )
+            except Exception:
+                connection.rollback()
+                self.logger.exception(f"Migration '{path.name}' failed.")
+                raise
+            applied.append(path.name)
+        return applied
+
+    def refresh_monthly_sales(self, shop_id: int, first_month: str) -> None:
+        """
+        Recompute the `monthly_sales` rollup for a shop from `first_month` onwards.
+
+        Parameters
+        ----------
+        shop_id : int
+            The shop whose rollup rows should be recomputed.
+        first_month : str
+            The earliest month affected by a write, in the format 'YYYY-MM'.
+        """
+        self.query(MONTHLY_SALES_REFRESH, (shop_id, first_month))
+
+    def rebuild_monthly_sales(self) -> None:
+        """
+        Rebuild the `monthly_sales` rollup from scratch using the raw `sales` table.
+        """
+        self.query("DELETE FROM monthly_sales;")
+        self.query(
+            "INSERT INTO monthly_sales (shop_id, year_month, revenue, sales) SELECT shop_id, substr(sale_date, 1, 7) AS year_month, SUM(total_price), SUM(quantity) FROM sales GROUP BY shop_id, year_month;"
+        )
+
+    def enqueue_pull_job(self, state: str, code: str, code_verifier: str) -> None:
+        """
+        Queue a data pull for the OAuth callback with the given state.
+        Repeated callbacks for the same state are ignored.
+
+        Parameters
+        ----------
+        state : str
+            The state string received by the OAuth callback.
+        code : str
+            The authorization code received by the OAuth callback.
+        code_verifier : str
+            The code verifier registered with `state`, needed to exchange `code` for tokens.
+        """
+        now: datetime = datetime.now()
+        self.query(
+            "INSERT OR IGNORE INTO jobs (state, code, code_verifier, status, attempts, date_added, date_updated) VALUES (?, ?, ?, 'queued', 0, ?, ?);",
+            (state, code, code_verifier, now, now),
+        )
+
+    def claim_pull_job(self) -> dict[str, Any] | None:
+        """
+        Atomically mark the oldest queued job as running and return it.
+
+        Jobs whose lease expired more than `JOB_LEASE` ago are requeued first.
+
+        Returns
+        -------
+        dict[str, Any] | None
+            The claimed job's 'job_id', 'state', 'code', 'code_verifier', 'shop_id', and 'attempts'
+            or `None` if nothing is queued.
+        """
+        now: datetime = datetime.now()
+        self.query(REQUEUE_EXPIRED_JOBS, (now - JOB_LEASE,))
+        rows: Rows = self.query(CLAIM_PULL_JOB, (now,))
+        # Release the write lock right away so other workers can claim jobs.
+        self.commit()
+        return rows[0] if rows else None
+
+    def update_pull_job(self, job_id: int, **fields: Any) -> None:
+        """
+        Update the given columns of a job.
+
+        Its `date_updated` is always set, so calling this with no columns renews the job's lease.
+
+        Parameters
+        ----------
+        job_id : int
+            The job to update.
+        **fields : Any
+            Column names and their new values.
+        """
+        fields["date_updated"] = datetime.now()
+        columns: str = ", ".join(f"{column} = ?" for column in fields)
+        self.query(
+            f"UPDATE jobs SET {columns} WHERE job_id = ?;",
+            (*fields.values(), job_id),
+        )
+
+    def get_pull_job(self, state: str) -> dict[str, Any] | None:
+        """
+        Get the status details of the job queued for the given state.
+
+        Parameters
+        ----------
+        state : str
+            The state string of the OAuth callback that queued the job.
+
+        Returns
+        -------
+        dict[str, Any] | None
+            The job details or `None` if there's no job for `state`.
+        """
+        rows: Rows = self.query(
+            "SELECT status, attempts, records, error, date_added, date_updated FROM jobs WHERE state = ?;",
+            (state,),
+        )
+        return rows[0] if rows else None
+
+    def get_sync_cursor(self, shop_id: int) -> int | None:
+        """
+        Get the creation timestamp of the newest receipt stored for a shop.
+
+        Falls back to the shop's latest `sale_date` for data saved before sync state was tracked.
+
+        Parameters
+        ----------
+        shop_id : int
+            The shop to get the cursor for.
+
+        Returns
+        -------
+        int | None
+            A unix timestamp or `None` if nothing has been stored for the shop.
+        """
+        rows: Rows = self.query(
+            "SELECT last_created FROM sync_state WHERE shop_id = ?;", (shop_id,)
+        )
+        if rows:
+            return rows[0]["last_created"]
+        rows = self.query(LAST_SALE_QUERY, (shop_id,))
+        last_sale: datetime | None = rows[0]["last_sale"]
+        return int(last_sale.timestamp()) if last_sale else None
+
+    def update_sync_state(
+        self, shop_id: int, last_created: int, last_receipt_id: int
+    ) -> None:
+        """
+        Advance a shop's sync cursor to the given receipt if it's newer than the current one.
+
+        Parameters
+        ----------
+        shop_id : int
+            The shop to update.
+        last_created : int
+            The creation timestamp of the newest stored receipt.
+        last_receipt_id : int
+            The id of the newest stored receipt.
+        """
+        self.query(
+            "INSERT INTO sync_state (shop_id, last_created, last_receipt_id, date_synced) VALUES (?, ?, ?, ?) ON CONFLICT (shop_id) DO UPDATE SET last_created = excluded.last_created, last_receipt_id = excluded.last_receipt_id, date_synced = excluded.date_synced WHERE excluded.last_created >= sync_state.last_created;",
+            (shop_id, last_created, last_receipt_id, datetime.now()),
+        )
+
+    def save_tokens(
+        self, shop_id: int, access_token: str, refresh_token: str, expiry: datetime
+    ) -> None:
+        """
+        Store the current OAuth tokens for a shop, replacing any previous ones.
+
+        Parameters
+        ----------
+        shop_id : int
+            The shop the tokens belong to.
+        access_token : str
+            The access token.
+        refresh_token : str
+            The refresh token.
+        expiry : datetime
+            When the access token expires, as a naive utc time.
+        """
+        now: datetime = datetime.now()
+        self.query(
+            "INSERT OR IGNORE INTO shops (shop_id, date_added) VALUES (?, ?);",
+            (shop_id, now),
+        )
+        self.query(
+            "INSERT OR REPLACE INTO tokens (shop_id, access_token, refresh_token, expiry, date_updated) VALUES (?, ?, ?, ?, ?);",
+            (shop_id, access_token, refresh_token, expiry, now),
+        )
+
+    def get_tokens(self, shop_id: int) -> dict[str, Any] | None:
+        """
+        Get the OAuth tokens stored for a shop.
+
+        Parameters
+        ----------
+        shop_id : int
+            The shop to get tokens for.
+
+        Returns
+        -------
+        dict[str, Any] | None
+            A dict with the keys 'access_token', 'refresh_token', and 'expiry'
+            or `None` if there are no tokens for `shop_id`.
+        """
+        rows: Rows = self.query(
+            "SELECT access_token, refresh_token, expiry FROM tokens WHERE shop_id = ?;",
+            (shop_id,),
+        )
+        return rows[0] if rows else None
+
+    def get_token_shop_ids(self) -> list[int]:
+        """
+        Returns
+        -------
+        list[int]
+            The ids of registered shops that have stored tokens.
+        """
+        return [
+            row["shop_id"]
+            for row in self.query(
+                "SELECT shop_id FROM tokens INNER JOIN shops USING (shop_id) ORDER BY shop_id;"
+            )
+        ]
+
+
+_local: threading.local = threading.local()
+
+
+@contextmanager
+def shared_db() -> Iterator[SCDatabased]:
+    """
+    Use this thread's long lived database connection instead of opening a new one.
+
+    The outermost `with` block commits on success and rolls back on error,
+    but the connection stays open for the next caller in the same thread.
+
+    >>> with shared_db() as db:
+    >>>     db.select("shops")
+
+    Yields
+    ------
+    SCDatabased
+        The connected database for the current thread.
+    """
+    # A forked process can't reuse its parent's connection.
+    if getattr(_local, "pid", None) != os.getpid():
+        _local.db = SCDatabased()
+        _local.pid = os.getpid()
+        _local.depth = 0
+        _local.generation = 0
+    db: SCDatabased = _local.db
+    if not db.connected:
+        db.connect()
+    _local.depth += 1
+    # `release_shared_db()` starts a new generation, after which a block it abandoned,
+    # e.g. in a streamed response that's closed late, mustn't touch the depth or transaction.
+    generation: int = _local.generation
+    try:
+        yield db
+    except BaseException:
+        if _local.generation == generation and _local.depth == 1:
+            cast(sqlite3.Connection, db.connection).rollback()
+        raise
+    else:
+        if _local.generation == generation and _local.depth == 1:
+            db.commit()
+    finally:
+        if _local.generation == generation:
+            _local.depth -= 1
+
+
+def release_shared_db() -> None:
+    """
+    Roll back any transaction left open on this thread's shared connection,
+    e.g. by a streamed response that was abandoned part way through.
+
+    Any `shared_db()` blocks still open on this thread are abandoned,
+    the next one is the outermost block again.
+    """
+    if getattr(_local, "pid", None) != os.getpid():
+        return
+    if _local.depth:
+        get_logger().warning(
+            f"Releasing the shared database connection with {_local.depth} blocks still open."
+        )
+        _local.depth = 0
+        _local.generation += 1
+    if _local.db.connected:
+        connection: sqlite3.Connection = cast(sqlite3.Connection, _local.db.connection)
+        if connection.in_transaction:
+            connection.rollback()
+
+
+def close_shared_db() -> None:
+    """
+    Close this thread's shared connection, if it has one.
+
+    The next `shared_db()` block opens a new connection, picking up any change to `sc_db-path`.
+    """
+    if getattr(_local, "pid", None) == os.getpid():
+        _local.db.close()
+        del _local.pid
@@ -1,12 +1,15 @@
 import os
-from datetime import datetime, timedelta
-from functools import cached_property
-from typing import Any, cast
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Iterator, cast
 
 import loggi
 
 # type ignores b/c etsy_python has no "typed" stub file
 from etsy_python.v3.auth.OAuth import EtsyOAuth  # type: ignore
+from etsy_python.v3.enums.ShopReceipt import SortOn, SortOrder  # type: ignore
 from etsy_python.v3.exceptions import RequestException  # type: ignore
 from etsy_python.v3.resources import ReceiptResource  # type: ignore
 from etsy_python.v3.resources import Response, UserResource  # type: ignore
@@ -15,8 +18,16 @@ from pathier import Pathier
 from typing_extensions import Self
 
 import exceptions
+import metrics
+import ratelimit
 from data_service import EtsyDataService
-from db import SCDatabased
+from db import shared_db
+
+# Default number of receipt pages requested at once by `AuthenticatedClient.get_sales_data()`.
+FETCH_CONCURRENCY: int = 4
+# Access tokens expiring sooner than this are refreshed before pages are requested concurrently,
+# enough for a long history to be fetched without a refresh part way through.
+TOKEN_REFRESH_MARGIN: timedelta = timedelta(minutes=5)
 
 
 def get_logger() -> loggi.Logger:
@@ -29,6 +40,46 @@ def get_logger() -> loggi.Logger:
     return loggi.getLogger("etsy", Pathier(__file__).parent / "logs")
 
 
+def utcnow() -> datetime:
+    """
+    Returns
+    -------
+    datetime
+        The current utc time as a naive datetime.
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class ThreadSafeEtsyClient(EtsyClient):  # type: ignore[misc]
+    """
+    `EtsyClient` whose token refresh can be triggered by several threads at once.
+
+    Refreshes are serialized and a thread that waited on another's refresh doesn't refresh again,
+    the refresh token is single use so the second refresh would fail.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._refresh_lock: threading.Lock = threading.Lock()
+
+    def refresh_if_expiring(self, margin: timedelta = timedelta(0)) -> None:
+        """
+        Refresh the access token if it expires within `margin`.
+
+        Parameters
+        ----------
+        margin : timedelta, optional
+            How long before expiry to refresh, by default 0.
+        """
+        with self._refresh_lock:
+            if datetime.now(timezone.utc) + margin >= self.ensure_utc(self.expiry):
+                super().update_token()
+
+    def update_token(self) -> tuple[str, str, datetime]:
+        self.refresh_if_expiring()
+        return self.access_token, self.refresh_token, self.expiry
+
+
 def log_and_raise_api_error(message: str) -> None:
     """
     Log an error message then raise an exception with that message.
@@ -71,11 +122,14 @@ class OAuthProvider:
         redirect: str | None = os.getenv("sc_oauth-redirect")
         if key is None or redirect is None:
             raise exceptions.MissingEnvException("Missing sc_* keys in .env")
-        return EtsyOAuth(
+        oauth: EtsyOAuth = EtsyOAuth(
             keystring=key,
             redirect_uri=redirect,
             scopes=["transactions_r", "shops_r"],
         )
+        # the token exchange reuses pooled connections too
+        ratelimit.mount_shared_adapter(oauth.oauth)
+        return oauth
 
     @staticmethod
     def get_auth_url() -> str:
@@ -92,25 +146,6 @@ class OAuthProvider:
         OAuthProvider._save_state(oauth)
         return auth_url
 
-    @staticmethod
-    def state_exists(state: str) -> bool:
-        """
-        Whether the given state string exists.
-        Used to verify the validity of the received callback.
-
-        Parameters
-        ----------
-        state : str
-            The state string to check.
-
-        Returns
-        -------
-        bool
-            Whether it exists.
-        """
-        with SCDatabased() as db:
-            return db.state_exists(state)
-
     @staticmethod
     def _save_state(oauth_instance: EtsyOAuth) -> None:
         """
@@ -121,34 +156,29 @@ class OAuthProvider:
         oauth_instance : EtsyOAuth
             The OAuth instance to save.
         """
-        with SCDatabased() as db:
+        with shared_db() as db:
             db.register_oauth(oauth_instance.state, oauth_instance.code_verifier)
 
     @staticmethod
-    def get_saved_oauth(state: str) -> EtsyOAuth:
+    def restore_oauth(state: str, code_verifier: str) -> EtsyOAuth:
         """
-        Retrieves an OAuth instance from the given state.
+        Recreate the OAuth instance that generated the given state.
 
         Parameters
         ----------
         state : str
             The previously used state.
+        code_verifier : str
+            The code verifier registered with `state`.
 
         Returns
         -------
         EtsyOAuth
-            The saved OAuth instance associated with the given state.
-
-        Raises
-        ------
-        MissingSessionDataException
-            If there's no OAuth entry matching `state`.
+            The OAuth instance, ready to exchange an authorization code.
         """
         oauth: EtsyOAuth = OAuthProvider.get_new_oauth()
-        with SCDatabased() as db:
-            session: dict[str, str] = db.get_oauth(state)
-        oauth.state = session["state"]
-        oauth.code_verifier = session["code_verifier"]
+        oauth.state = state
+        oauth.code_verifier = code_verifier
         return oauth
 
 
@@ -157,7 +187,7 @@ class AuthenticatedClient:
     Make authenticated requests to the Etsy API.
     """
 
-    def __init__(self, token_data: dict[str, str]) -> None:
+    def __init__(self, token_data: dict[str, str], shop_id: int | None = None) -> None:
         """
         Initialize the instance.
 
@@ -165,6 +195,8 @@ class AuthenticatedClient:
         ----------
         token_data : dict[str, str]
             Token data received via OAuth.
+        shop_id : int | None, optional
+            The shop id the tokens belong to, if already known. By default None.
 
         Raises
         ------
@@ -172,18 +204,21 @@ class AuthenticatedClient:
             If `sc_keystring` doesn't exist in env variable.
         """
         key: str | None = os.getenv("sc_keystring")
-        self._shop_id: str | None = None
+        self._shop_id: int | None = shop_id
         if not key:
             raise exceptions.MissingEnvException("Missing sc_* keys in .env")
-        self.client: EtsyClient = EtsyClient(
+        self.client: ThreadSafeEtsyClient = ThreadSafeEtsyClient(
             keystring=key,
             access_token=token_data["access_token"],
             refresh_token=token_data["refresh_token"],
-            expiry=datetime.now() + timedelta(seconds=int(token_data["expires_in"])),
+            # etsy_python treats naive expiry times as utc
+            expiry=utcnow() + timedelta(seconds=int(token_data["expires_in"])),
+            sync_refresh=self._sync_refresh,
         )
+        ratelimit.mount_shared_adapter(self.client.session)
 
     @classmethod
-    def from_redirect(cls, code: str, state: str) -> Self:
+    def from_redirect(cls, code: str, state: str, code_verifier: str) -> Self:
         """
         Return an `AuthenticatedClient` instance from parameters provided by the Etsy callback.
 
@@ -193,23 +228,55 @@ class AuthenticatedClient:
             The authorization code received.
         state : str
             The state received.
+        code_verifier : str
+            The code verifier registered with `state`.
 
         Returns
         -------
         Self
             A new instance
-
-        Raises
-        ------
-        exceptions.MissingSessionDataException
-            If there's no OAuth entry matching state.
         """
-        oauth: EtsyOAuth = OAuthProvider.get_saved_oauth(state)
+        oauth: EtsyOAuth = OAuthProvider.restore_oauth(state, code_verifier)
         oauth.set_authorisation_code(code=code, state=state)
         token_data: dict[str, str] = cast(dict[str, str], oauth.get_access_token())
         return cls(token_data)
 
-    @cached_property
+    @classmethod
+    def from_stored(cls, shop_id: int) -> Self:
+        """
+        Return an `AuthenticatedClient` instance using the tokens stored for a shop.
+        An expired access token is refreshed on the first request.
+
+        Parameters
+        ----------
+        shop_id : int
+            The shop to authenticate as.
+
+        Returns
+        -------
+        Self
+            A new instance
+
+        Raises
+        ------
+        exceptions.MissingTokensException
+            If there are no tokens stored for `shop_id`.
+        """
+        with shared_db() as db:
+            tokens: dict[str, Any] | None = db.get_tokens(shop_id)
+        if tokens is None:
+            raise exceptions.MissingTokensException(shop_id)
+        expires_in: int = max(0, int((tokens["expiry"] - utcnow()).total_seconds()))
+        return cls(
+            {
+                "access_token": tokens["access_token"],
+                "refresh_token": tokens["refresh_token"],
+                "expires_in": str(expires_in),
+            },
+            shop_id,
+        )
+
+    @property
     def shop_id(self) -> int:
         """
         Returns
@@ -217,6 +284,8 @@ class AuthenticatedClient:
         int
             The shop id of the user that authenticated this instance.
         """
+        if self._shop_id is not None:
+            return self._shop_id
         user: UserResource = UserResource(self.client)
         try:
             # etsy_python mistyped resource objects to either return
@@ -228,50 +297,199 @@ class AuthenticatedClient:
             log_and_raise_api_error(f"Getting shop id failed: {e}")
         # type ignore b/c etsy_python mistyped `message` field as `str`
         # even though it's `dict[str, Any]` for any successful request that returns data
-        return int(response.message["shop_id"])  # type: ignore
+        self._shop_id = int(response.message["shop_id"])  # type: ignore
+        return self._shop_id
 
-    def get_sales_data(self) -> list[dict[str, Any]]:
+    def save_tokens(self) -> None:
+        """
+        Store this instance's current tokens so the shop can be pulled again without re-authorizing.
         """
+        with shared_db() as db:
+            db.save_tokens(
+                self.shop_id,
+                self.client.access_token,
+                self.client.refresh_token,
+                self.client.expiry,
+            )
+
+    def _sync_refresh(
+        self, access_token: str, refresh_token: str, expiry: datetime
+    ) -> None:
+        """
+        Called by `EtsyClient` after it refreshes the access token.
+        Refresh tokens are single use, so the new ones are stored right away.
+
+        Parameters
+        ----------
+        access_token : str
+            The new access token.
+        refresh_token : str
+            The new refresh token.
+        expiry : datetime
+            When the new access token expires.
+        """
+        # Refreshing while getting the shop id for the first time,
+        # `pull_data()` stores the tokens once it's known.
+        if self._shop_id is not None:
+            self.save_tokens()
+
+    def _get_receipts_page(
+        self,
+        receipts: ReceiptResource,
+        offset: int,
+        limit: int,
+        min_created: int | None = None,
+    ) -> dict[str, Any]:
+        """
+        Get a single page of this shop's receipts, oldest first.
+
+        Parameters
+        ----------
+        receipts : ReceiptResource
+            The resource to make the request with.
+        offset : int
+            The offset of the first receipt in the page.
+        limit : int
+            The maximum number of receipts in the page.
+        min_created : int | None, optional
+            Only include receipts created at or after this unix timestamp, by default None.
+
         Returns
         -------
-        list[dict[str, Any]]
-            All available transaction data where this shop was the seller.
+        dict[str, Any]
+            The response data with the keys 'count' and 'results'.
         """
-        receipts: ReceiptResource = ReceiptResource(self.client)
-        offset: int = 0
-        limit: int = 100
-        total: int = -1
-        results: list[dict[str, Any]] = []
-        # don't know total until we get the first response
-        while total == -1 or len(results) < total:
-            try:
+        try:
+            with metrics.API_PAGE_SECONDS.time():
                 response: Response = cast(
                     Response,
                     receipts.get_shop_receipts(
                         self.shop_id,
+                        min_created=min_created,
                         limit=limit,
                         offset=offset,
+                        # oldest first so offsets stay stable if new receipts come in mid pull
+                        sort_on=SortOn.CREATED,
+                        sort_order=SortOrder.ASC,
                         was_paid=True,
                         was_canceled=False,
                     ),
                 )
-            except RequestException as e:
-                message = f"Failure to get receipts for shop id '{self.shop_id}'\n{offset=}\n{total=}\n{len(results)=}\n{e}"
-                log_and_raise_api_error(message)
-            else:
-                # etsy_python mistyped `message` field as `str`
-                # even though it's `dict[str, Any]` for any successful request that returns data
-                data: dict[str, Any] = cast(dict[str, Any], response.message)
-                total = data["count"]
-                results.extend(data["results"])
-                offset += limit
-        return results
-
-    def pull_data(self) -> None:
+        except RequestException as e:
+            message = f"Failure to get receipts for shop id '{self.shop_id}'\n{offset=}\n{limit=}\n{e}"
+            log_and_raise_api_error(message)
+        # etsy_python mistyped `message` field as `str`
+        # even though it's `dict[str, Any]` for any successful request that returns data
+        page: dict[str, Any] = cast(dict[str, Any], response.message)
+        metrics.API_RECEIPTS.inc(len(page["results"]))
+        return page
+
+    def iter_sales_pages(
+        self, concurrency: int | None = None, min_created: int | None = None
+    ) -> Iterator[list[dict[str, Any]]]:
+        """
+        Yield pages of transaction data, oldest first, as they're retrieved.
+
+        At most `concurrency` pages are requested or waiting to be consumed at a time,
+        so memory use is bounded by the page size rather than the shop's history.
+
+        Parameters
+        ----------
+        concurrency : int | None, optional
+            The maximum number of pages to request at once.
+            Defaults to the `sc_fetch-concurrency` environment variable or `FETCH_CONCURRENCY`.
+        min_created : int | None, optional
+            Only retrieve receipts created at or after this unix timestamp, by default None.
+
+        Yields
+        ------
+        list[dict[str, Any]]
+            A page of transaction data where this shop was the seller.
+        """
+        concurrency = concurrency or int(
+            os.getenv("sc_fetch-concurrency", FETCH_CONCURRENCY)
+        )
+        receipts: ReceiptResource = ReceiptResource(self.client)
+        limit: int = 100
+        # don't know total until we get the first response
+        first_page: dict[str, Any] = self._get_receipts_page(
+            receipts, 0, limit, min_created
+        )
+        yield first_page["results"]
+        offsets: range = range(limit, first_page["count"], limit)
+        if concurrency == 1 or len(offsets) < 2:
+            for offset in offsets:
+                page: dict[str, Any] = self._get_receipts_page(
+                    receipts, offset, limit, min_created
+                )
+                yield page["results"]
+            return
+        # refreshing removes the session's authorization header, which would fail requests sent meanwhile
+        self.client.refresh_if_expiring(TOKEN_REFRESH_MARGIN)
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            pending: deque[Future[dict[str, Any]]] = deque()
+            for offset in offsets:
+                pending.append(
+                    executor.submit(
+                        self._get_receipts_page, receipts, offset, limit, min_created
+                    )
+                )
+                # pages are yielded in offset order regardless of completion order
+                if len(pending) == concurrency:
+                    yield pending.popleft().result()["results"]
+            while pending:
+                yield pending.popleft().result()["results"]
+
+    def get_sales_data(
+        self, concurrency: int | None = None, min_created: int | None = None
+    ) -> list[dict[str, Any]]:
         """
-        Retrieve and save transaction data for this seller.
+        Parameters
+        ----------
+        concurrency : int | None, optional
+            The maximum number of pages to request at once.
+            Defaults to the `sc_fetch-concurrency` environment variable or `FETCH_CONCURRENCY`.
+        min_created : int | None, optional
+            Only retrieve receipts created at or after this unix timestamp, by default None.
+
+        Returns
+        -------
+        list[dict[str, Any]]
+            All available transaction data where this shop was the seller.
+        """
+        return [
+            receipt
+            for page in self.iter_sales_pages(concurrency, min_created)
+            for receipt in page
+        ]
+
+    def pull_data(self) -> int:
         """
-        get_logger().info(f"Pulling sales data for shop '{self.shop_id}'.")
-        data: list[dict[str, Any]] = self.get_sales_data()
-        EtsyDataService.save_transaction_data(self.shop_id, data)
-        get_logger().info(f"Retrieved {len(data)} records for shop '{self.shop_id}'.")
+        Retrieve and save transaction data for this seller
+        that's newer than what's already been stored.
+
+        This instance's tokens are stored as well, so the shop can be pulled again later by `repull.py`.
+
+        Each page is handed to the ingest writer and committed as it arrives,
+        so an interrupted pull keeps the pages it already got and the next pull resumes after them.
+
+        Returns
+        -------
+        int
+            The number of records retrieved.
+        """
+        self.save_tokens()
+        with shared_db() as db:
+            cursor: int | None = db.get_sync_cursor(self.shop_id)
+        get_logger().info(
+            f"Pulling sales data for shop '{self.shop_id}' created after '{cursor}'."
+        )
+        # The cursor receipt is fetched again in case others were created in the same second,
+        # saving is idempotent so it won't be duplicated.
+        records, inserted, updated = EtsyDataService.save_transaction_pages(
+            self.shop_id, self.iter_sales_pages(min_created=cursor)
+        )
+        get_logger().info(
+            f"Retrieved {records} records for shop '{self.shop_id}' ({inserted} new transactions, {updated} updated)."
+        )
+        return records
@@ -11,4 +11,14 @@ class MissingSessionDataException(SalesCollectorException):
         super().__init__(f"Missing information for the given state.")
 
 
+class MissingTokensException(SalesCollectorException):
+    def __init__(self, shop_id: int) -> None:
+        super().__init__(f"No stored tokens for shop '{shop_id}'.")
+
+
 class APIException(SalesCollectorException): ...
+
+
+class WriterStoppedException(SalesCollectorException):
+    def __init__(self) -> None:
+        super().__init__("The ingest writer isn't running.")
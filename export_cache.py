@@ -0,0 +1,184 @@
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Iterable, Iterator
+from uuid import uuid4
+
+from pathier import Pathier
+
+VERSION_PATH: Pathier = Pathier(__file__).parent / "data.version"
+# Holds a version file per shop, named by shop id.
+SHOP_VERSIONS_DIR: Pathier = Pathier(__file__).parent / "shop.versions"
+# The version of a shop without a version file.
+UNVERSIONED: str = "0"
+
+
+def _write_version(path: Pathier) -> None:
+    # Write then rename so readers in other processes never see a partial file.
+    temp_path: Pathier = path.with_name(f"{path.name}.{os.getpid()}")
+    temp_path.write_text(uuid4().hex, encoding="utf-8")
+    temp_path.replace(path)
+
+
+def bump_data_version(shop_ids: Iterable[int] = ()) -> None:
+    """
+    Mark the stored sales data as changed.
+    Should be called after new data has been committed to the database.
+
+    Parameters
+    ----------
+    shop_ids : Iterable[int], optional
+        The shops whose data changed, their versions are bumped too. By default ().
+    """
+    _write_version(VERSION_PATH)
+    for shop_id in shop_ids:
+        SHOP_VERSIONS_DIR.mkdir(exist_ok=True)
+        _write_version(SHOP_VERSIONS_DIR / str(shop_id))
+
+
+def get_data_version() -> tuple[str, datetime]:
+    """
+    Get the current data version without touching the database.
+
+    Returns
+    -------
+    tuple[str, datetime]
+        The version tag and the (UTC, second resolution) time it was last changed.
+    """
+    if not VERSION_PATH.exists():
+        bump_data_version()
+    tag: str = VERSION_PATH.read_text(encoding="utf-8").strip()
+    last_modified: datetime = datetime.fromtimestamp(
+        VERSION_PATH.stat().st_mtime, timezone.utc
+    ).replace(microsecond=0)
+    return tag, last_modified
+
+
+def get_shop_version(shop_id: int) -> str:
+    """
+    Get the version of a shop's data without touching the database.
+
+    Parameters
+    ----------
+    shop_id : int
+        The shop.
+
+    Only `bump_data_version()` writes version files,
+    so looking up shops that don't exist leaves nothing behind.
+
+    Returns
+    -------
+    str
+        The version tag, `UNVERSIONED` if the shop's data has never been bumped.
+    """
+    try:
+        return (SHOP_VERSIONS_DIR / str(shop_id)).read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        return UNVERSIONED
+
+
+class ExportCache:
+    """
+    In-process cache of rendered exports keyed by a variant name and the data version they were built from.
+    """
+
+    def __init__(self, max_entries: int = 16, max_bytes: int | None = None) -> None:
+        """
+        Initialize the cache.
+
+        Least recently used entries are evicted first once either limit is exceeded.
+
+        Parameters
+        ----------
+        max_entries : int, optional
+            The number of variants to keep, by default 16.
+        max_bytes : int | None, optional
+            The total size of the content to keep, by default unlimited.
+        """
+        self.max_entries: int = max_entries
+        self.max_bytes: int | None = max_bytes
+        self.size: int = 0
+        self._lock: threading.Lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[str, bytes]] = OrderedDict()
+
+    def get(self, key: str, version: str) -> bytes | None:
+        """
+        Get the cached content for `key` if it was built from `version`.
+
+        Parameters
+        ----------
+        key : str
+            The export variant.
+        version : str
+            The current data version tag.
+
+        Returns
+        -------
+        bytes | None
+            The cached content or `None` if there's no current entry.
+        """
+        with self._lock:
+            entry: tuple[str, bytes] | None = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None or entry[0] != version:
+            return None
+        return entry[1]
+
+    def stream_and_store(
+        self, key: str, version: str, chunks: Iterable[bytes]
+    ) -> Iterator[bytes]:
+        """
+        Pass `chunks` through and cache the full content once the stream completes.
+
+        If the data changes while streaming, the stored content is newer than `version`,
+        so the entry just goes stale on the next version check instead of serving old data.
+
+        Parameters
+        ----------
+        key : str
+            The export variant.
+        version : str
+            The data version tag read before generating the export.
+        chunks : Iterable[bytes]
+            The export content.
+
+        Yields
+        ------
+        bytes
+            The chunks from `chunks`.
+        """
+        parts: list[bytes] = []
+        for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+        self.put(key, version, b"".join(parts))
+
+    def put(self, key: str, version: str, content: bytes) -> None:
+        """
+        Cache `content` for `key`, evicting the least recently used entries if over a limit.
+
+        Content bigger than `max_bytes` on its own isn't cached.
+
+        Parameters
+        ----------
+        key : str
+            The export variant.
+        version : str
+            The data version tag read before generating `content`.
+        content : bytes
+            The export content.
+        """
+        with self._lock:
+            old: tuple[str, bytes] | None = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old[1])
+            if self.max_bytes is not None and len(content) > self.max_bytes:
+                return
+            self._entries[key] = (version, content)
+            self.size += len(content)
+            while len(self._entries) > self.max_entries or (
+                self.max_bytes is not None and self.size > self.max_bytes
+            ):
+                self.size -= len(self._entries.popitem(last=False)[1][1])
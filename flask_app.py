@@ -1,23 +1,102 @@
+import hashlib
+import json
+import os
+import re
+import sys
+from functools import cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+from uuid import uuid4
+
 import dotenv
-import loggi
-from flask import Flask, Response, request, send_file
-from pathier import Pathier
+from flask import Flask, Response, g, jsonify, request, stream_with_context
 
-import etsy
 import exceptions
-from data_service import EtsyDataService
-from etsy import AuthenticatedClient, OAuthProvider
+
+# Everything that pulls in `etsy_python`, `databased` or `loggi` is imported by the routes that use it,
+# so a new worker can serve the landing page without loading them.
+# `pathlib` is used here instead of `pathier` for the same reason.
+if TYPE_CHECKING:
+    import cProfile
+
+    import loggi
+
+    from export_cache import ExportCache
 
 app = Flask(__name__)
 
-if not (Pathier(__file__).parent / ".env").exists():
+if not (Path(__file__).parent / ".env").exists():
     raise exceptions.MissingEnvException("Could not find '.env' file.")
-dotenv.load_dotenv(Pathier(__file__).parent / ".env")
+dotenv.load_dotenv(Path(__file__).parent / ".env")
+
+PAGES_DIR: Path = Path(__file__).parent / "pages"
+# Seconds clients may reuse a page without revalidating it.
+PAGE_MAX_AGE: int = 300
+# Bytes of `/salesaggregate` responses kept in memory.
+AGGREGATE_CACHE_BYTES: int = 32 * 1024 * 1024
+
+
+@app.teardown_appcontext
+def release_db(exception: BaseException | None) -> None:
+    """
+    Leave this thread's shared database connection open for the next request
+    but without a transaction holding locks in between.
+    """
+    # nothing to release if no route has used the database yet
+    db = sys.modules.get("db")
+    if db is not None:
+        db.release_shared_db()
 
 
-def load_content(filename: str) -> str:
+@app.before_request
+def start_profile() -> None:
     """
-    Read content from the given file located in the 'pages' directory.
+    Profile the request if the `sc_profile-dir` environment variable is set.
+
+    The profile is keyed by the request's `X-Request-ID` header, or a generated id,
+    which is sent back in the response's `X-Request-ID` header.
+    """
+    if not os.getenv("sc_profile-dir"):
+        return
+    request_id: str = request.headers.get("X-Request-ID", "")
+    # the id is used as a file name
+    if not re.fullmatch(r"[\w-]{1,64}", request_id):
+        request_id = uuid4().hex
+    import cProfile
+
+    profiler: "cProfile.Profile" = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # another profiler is already running
+        return
+    g.profile = (profiler, request_id)
+
+
+@app.after_request
+def stop_profile(response: Response) -> Response:
+    """
+    Write the request's profile to '{sc_profile-dir}/{request id}.prof'
+    once the response, including any streamed content, has been sent.
+    """
+    if "profile" not in g:
+        return response
+    profiler, request_id = g.pop("profile")
+
+    def dump() -> None:
+        profiler.disable()
+        profile_dir: Path = Path(os.environ["sc_profile-dir"])
+        profile_dir.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(profile_dir / f"{request_id}.prof")
+
+    response.call_on_close(dump)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+
+def read_page(filename: str) -> tuple[str, str, float]:
+    """
+    Read a page from the 'pages' directory.
 
     Parameters
     ----------
@@ -26,49 +105,117 @@ def load_content(filename: str) -> str:
 
     Returns
     -------
-    str
-        The file content.
+    tuple[str, str, float]
+        The page content, an ETag for it, and the file's modification time.
     """
-    pages_dir: Pathier = Pathier(__file__).parent / "pages"
-    return (pages_dir / filename).read_text(encoding="utf-8")
+    path: Path = PAGES_DIR / filename
+    content: str = path.read_text(encoding="utf-8")
+    etag: str = hashlib.sha1(content.encode("utf-8")).hexdigest()[:16]
+    return content, etag, path.stat().st_mtime
 
 
-def get_logger() -> loggi.Logger:
+def load_content(filename: str) -> tuple[str, str]:
+    """
+    Get a page from memory.
+
+    In debug mode the file is checked for changes and re-read if it's been modified.
+
+    Parameters
+    ----------
+    filename : str
+        The file name.
+
+    Returns
+    -------
+    tuple[str, str]
+        The page content and an ETag for it.
+    """
+    if app.debug and (
+        filename not in pages
+        or (PAGES_DIR / filename).stat().st_mtime != pages[filename][2]
+    ):
+        pages[filename] = read_page(filename)
+    content, etag, _ = pages[filename]
+    return content, etag
+
+
+def page_response(filename: str, cacheable: bool = True) -> Response:
+    """
+    Serve a page from the 'pages' directory.
+
+    Parameters
+    ----------
+    filename : str
+        The file name.
+    cacheable : bool, optional
+        Whether clients may cache the page, by default True.
+        Pages showing the outcome of a request should never be cached.
+
+    Returns
+    -------
+    Response
+        The page, or a 304 if the client's cached copy is current.
+    """
+    content, etag = load_content(filename)
+    response: Response = Response(content, mimetype="text/html")
+    if not cacheable:
+        response.cache_control.no_store = True
+        return response
+    response.set_etag(etag)
+    if app.debug:
+        response.cache_control.no_cache = True
+    else:
+        response.cache_control.public = True
+        response.cache_control.max_age = PAGE_MAX_AGE
+    return response.make_conditional(request)
+
+
+# filename: (content, etag, modification time)
+pages: dict[str, tuple[str, str, float]] = {
+    path.name: read_page(path.name) for path in PAGES_DIR.glob("*.html")
+}
+
+
+def get_logger() -> "loggi.Logger":
     """
     Returns
     -------
     loggi.Logger
         An 'app' logger.
     """
-    return loggi.getLogger("app", Pathier(__file__).parent / "logs")
+    import loggi
+
+    return loggi.getLogger("app", Path(__file__).parent / "logs")
 
 
 @app.route("/")
-def landing() -> str:
+def landing() -> Response:
     """
     Handles primary page of website.
 
     Returns
     -------
-    str
-        The page content to display.
+    Response
+        The page to display.
     """
     code: str | None = request.args.get("code", None)
     state: str = request.args.get("state", "")
-    if code is not None and OAuthProvider.state_exists(state):
-        try:
-            AuthenticatedClient.from_redirect(code, state).pull_data()
-        except Exception:
-            etsy.get_logger().exception("Error pulling shop data from Etsy\n")
-            return load_content("error.html")
-        else:
-            return load_content("thanks.html")
-    if code is not None and not OAuthProvider.state_exists(state):
+    if code is None:
+        return page_response("landing.html")
+    import jobs
+
+    # The pull runs in a `worker.py` process, progress is reported by `/pullstatus`.
+    try:
+        queued: bool = jobs.enqueue_pull(code, state)
+    except Exception:
+        get_logger().exception("Error queueing shop data pull\n")
+        return page_response("error.html", cacheable=False)
+    if not queued:
         get_logger().info(
             f"Url has code param present ('{code}'), but no valid state param ('{state}')."
         )
-        return load_content("error.html")
-    return load_content("landing.html")
+        return page_response("error.html", cacheable=False)
+    return page_response("thanks.html", cacheable=False)
 
 
 @app.route("/authurl")
@@ -81,17 +228,291 @@ def get_etsy_auth_url() -> str:
     str
         The authorization url.
     """
+    from etsy import OAuthProvider
+
     return OAuthProvider.get_auth_url()
 
 
+@app.route("/pullstatus")
+def get_pull_status() -> tuple[Response, int]:
+    """
+    Report the progress of the data pull queued for the `state` query parameter.
+
+    Returns
+    -------
+    tuple[Response, int]
+        The job status as json and the status code.
+    """
+    import jobs
+
+    status: dict[str, Any] | None = jobs.get_pull_status(request.args.get("state", ""))
+    if status is None:
+        return jsonify({"status": "unknown"}), 404
+    return jsonify(status), 200
+
+
+@cache
+def get_csv_cache() -> "ExportCache":
+    """
+    Returns
+    -------
+    ExportCache
+        The process's cache of `/salesdata` exports.
+    """
+    from export_cache import ExportCache
+
+    return ExportCache()
+
+
+@cache
+def get_aggregate_cache() -> "ExportCache":
+    """
+    Returns
+    -------
+    ExportCache
+        The process's cache of `/salesaggregate` responses.
+    """
+    from export_cache import ExportCache
+
+    return ExportCache(max_entries=10_000, max_bytes=AGGREGATE_CACHE_BYTES)
+
+
+def get_sales_filters(
+    shop: bool = True,
+) -> tuple[int | None, str | None, str | None] | Response:
+    """
+    Parse the query parameters the sales routes filter by.
+
+    Parameters
+    ----------
+    shop : bool, optional
+        Whether the route takes a `shop_id`, by default True.
+
+    Returns
+    -------
+    tuple[int | None, str | None, str | None] | Response
+        The `shop_id` and the `start` and `end` months in the format 'YYYY-MM', `None` for any not given,
+        or a 400 response naming the malformed parameter or if `start` is after `end`.
+    """
+    from data_service import EtsyDataService
+
+    shop_id: int | None = None
+    if shop:
+        try:
+            shop_id = (
+                int(request.args["shop_id"]) if "shop_id" in request.args else None
+            )
+        except ValueError:
+            return Response("'shop_id' should be an integer.", 400)
+    try:
+        start: str | None = (
+            EtsyDataService.parse_month(request.args["start"])
+            if "start" in request.args
+            else None
+        )
+        stop: str | None = (
+            EtsyDataService.parse_month(request.args["end"])
+            if "end" in request.args
+            else None
+        )
+    except ValueError:
+        return Response("'start' and 'end' should be in the format 'YYYY-MM'.", 400)
+    # 'YYYY-MM' strings sort chronologically
+    if start and stop and start > stop:
+        return Response("'start' should not be after 'end'.", 400)
+    return shop_id, start, stop
+
+
 @app.route("/salesdata")
 def get_csv_data() -> Response:
     """
-    Write database to csv.
+    Stream the condensed data as a csv file.
+    The response is gzipped if the client accepts it.
+
+    The optional `start` and `end` query parameters, in the format 'YYYY-MM',
+    limit the months included. By default the export covers the months that have stored sales.
+
+    The export is cached per data version and the response carries `ETag` and `Last-Modified` headers,
+    so unchanged data is answered with a 304 or served from memory without querying the database.
 
     Returns
     -------
     Response
         The csv file.
     """
-    return send_file(EtsyDataService.write_data_to_csv())
+    import export_cache
+    import metrics
+    from data_service import EtsyDataService
+
+    filters: tuple[int | None, str | None, str | None] | Response = get_sales_filters(
+        shop=False
+    )
+    if isinstance(filters, Response):
+        return filters
+    _, start, stop = filters
+    compress: bool = request.accept_encodings["gzip"] > 0
+    encoding: str = "gzip" if compress else "identity"
+    variant: str = f"{start or ''}:{stop or ''}:{encoding}"
+    version, last_modified = export_cache.get_data_version()
+    etag: str = f"{version}-{variant}"
+    if request.if_none_match.contains(etag) or (
+        not request.if_none_match
+        and request.if_modified_since is not None
+        and request.if_modified_since >= last_modified
+    ):
+        response: Response = Response(status=304)
+    else:
+        csv_cache: "ExportCache" = get_csv_cache()
+        cached: bytes | None = csv_cache.get(variant, version)
+        response = Response(
+            (
+                cached
+                if cached is not None
+                else stream_with_context(
+                    csv_cache.stream_and_store(
+                        variant,
+                        version,
+                        metrics.time_chunks(
+                            EtsyDataService.stream_csv(compress, start, stop),
+                            metrics.EXPORT_SECONDS,
+                            metrics.EXPORT_BYTES,
+                            encoding=encoding,
+                        ),
+                    )
+                )
+            ),
+            mimetype="text/csv",
+            headers={"Content-Disposition": "attachment; filename=etsy-sales.csv"},
+        )
+        if compress:
+            response.content_encoding = "gzip"
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+@app.route("/salesaggregate")
+def get_sales_aggregate() -> Response:
+    """
+    Total revenue and sales per period as json.
+
+    The optional `shop_id` query parameter limits the totals to one shop,
+    the optional `start` and `end` query parameters, in the format 'YYYY-MM', limit the months included,
+    and the `granularity` query parameter chooses 'month', the default, 'week', or 'day' periods.
+
+    Responses are cached in memory until the shop's data, or any data if no shop is given, changes.
+
+    Returns
+    -------
+    Response
+        The totals.
+    """
+    import export_cache
+    from data_service import EtsyDataService
+
+    granularity: str = request.args.get("granularity", "month")
+    if granularity not in EtsyDataService.AGGREGATE_GRANULARITIES:
+        return Response(
+            f"'granularity' should be one of {', '.join(EtsyDataService.AGGREGATE_GRANULARITIES)}.",
+            400,
+        )
+    filters: tuple[int | None, str | None, str | None] | Response = get_sales_filters()
+    if isinstance(filters, Response):
+        return filters
+    shop_id, start, stop = filters
+    key: str = (
+        f"{'' if shop_id is None else shop_id}:{start or ''}:{stop or ''}:{granularity}"
+    )
+    version: str = (
+        export_cache.get_data_version()[0]
+        if shop_id is None
+        else export_cache.get_shop_version(shop_id)
+    )
+    aggregate_cache: "ExportCache" = get_aggregate_cache()
+    content: bytes | None = aggregate_cache.get(key, version)
+    if content is None:
+        content = json.dumps(
+            {
+                "shop_id": shop_id,
+                "start": start,
+                "end": stop,
+                "granularity": granularity,
+                "data": EtsyDataService.get_sales_aggregate(
+                    shop_id, start, stop, granularity
+                ),
+            }
+        ).encode("utf-8")
+        aggregate_cache.put(key, version, content)
+    response: Response = Response(content, mimetype="application/json")
+    response.set_etag(f"{version}-{key}")
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+# format: (mimetype, file name)
+EXPORT_FILES: dict[str, tuple[str, str]] = {
+    "ndjson": ("application/gzip", "etsy-sales.ndjson.gz"),
+    "parquet": ("application/vnd.apache.parquet", "etsy-sales.parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "etsy-sales.arrows"),
+}
+
+
+@app.route("/salesexport")
+def get_sales_export() -> Response:
+    """
+    Stream the raw sales table as a file.
+
+    The `format` query parameter chooses between gzipped 'ndjson', the default,
+    and, if `pyarrow` is installed, 'parquet' or 'arrow'.
+
+    The optional `shop_id` query parameter limits the export to one shop,
+    and the optional `start` and `end` query parameters, in the format 'YYYY-MM', limit the months included.
+
+    Returns
+    -------
+    Response
+        The file.
+    """
+    import metrics
+    from data_service import EtsyDataService
+
+    format_: str = request.args.get("format", "ndjson")
+    formats: list[str] = EtsyDataService.get_export_formats()
+    if format_ not in formats:
+        return Response(f"'format' should be one of {', '.join(formats)}.", 400)
+    filters: tuple[int | None, str | None, str | None] | Response = get_sales_filters()
+    if isinstance(filters, Response):
+        return filters
+    shop_id, start, stop = filters
+    mimetype, filename = EXPORT_FILES[format_]
+    response: Response = Response(
+        stream_with_context(
+            metrics.time_chunks(
+                EtsyDataService.stream_sales(format_, shop_id, start, stop),
+                metrics.SALES_EXPORT_SECONDS,
+                metrics.SALES_EXPORT_BYTES,
+                format=format_,
+            )
+        ),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
+    response.cache_control.no_store = True
+    return response
+
+
+@app.route("/metrics")
+def get_metrics() -> Response:
+    """
+    Expose this process's timings and counters.
+
+    Returns
+    -------
+    Response
+        The metrics in the Prometheus text format.
+    """
+    import metrics
+
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
@@ -1,12 +1,26 @@
 from pathier import Pathier
 
+import export_cache
 from db import SCDatabased
 
 
 def main() -> None:
-    """Initialize the database using the 'schema.sql' file."""
+    """
+    Initialize the database using the 'schema.sql' file
+    and apply any pending scripts from the 'migrations' directory.
+    """
+    root: Pathier = Pathier(__file__).parent
     with SCDatabased() as db:
-        db.execute_script(Pathier(__file__).parent / "schema.sql")
+        db.execute_script(root / "schema.sql")
+        applied: list[str] = db.apply_migrations(root / "migrations")
+        for migration in applied:
+            print(f"Applied migration '{migration}'.")
+        shop_ids: list[int] = [
+            row["shop_id"] for row in db.select("shops", ["shop_id"])
+        ]
+    # migrations can change stored sales, e.g. removing duplicates and rebuilding the rollup
+    if applied:
+        export_cache.bump_data_version(shop_ids)
 
 
 if __name__ == "__main__":
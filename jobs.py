@@ -0,0 +1,194 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+import etsy
+import metrics
+from db import JOB_LEASE, close_shared_db, shared_db
+from etsy import AuthenticatedClient
+from exceptions import MissingSessionDataException
+
+# Number of times a pull is attempted before the job is marked as failed.
+MAX_ATTEMPTS: int = 3
+# Seconds to wait before the first retry, doubled for each subsequent retry.
+RETRY_DELAY: float = 5
+# Seconds between renewals of a running job's lease.
+LEASE_RENEWAL: float = JOB_LEASE.total_seconds() / 5
+
+
+def enqueue_pull(code: str, state: str) -> bool:
+    """
+    Consume the OAuth state of a completed callback and queue a data pull with its code verifier,
+    so the pull doesn't depend on the state still being stored when a worker gets to it.
+
+    Parameters
+    ----------
+    code : str
+        The authorization code received.
+    state : str
+        The state received.
+
+    Returns
+    -------
+    bool
+        Whether a pull is queued for `state`, false if it's unknown or expired.
+        A repeated callback for an already queued state returns true.
+    """
+    with shared_db() as db:
+        try:
+            session: dict[str, str] = db.get_oauth(state)
+        except MissingSessionDataException:
+            return db.get_pull_job(state) is not None
+        db.enqueue_pull_job(state, code, session["code_verifier"])
+    return True
+
+
+def get_pull_status(state: str) -> dict[str, Any] | None:
+    """
+    Get the progress of the pull queued for the given state.
+
+    Parameters
+    ----------
+    state : str
+        The state received by the OAuth callback.
+
+    Returns
+    -------
+    dict[str, Any] | None
+        The job's status details or `None` if no job exists for `state`.
+    """
+    with shared_db() as db:
+        return db.get_pull_job(state)
+
+
+@contextmanager
+def lease(job_id: int) -> Iterator[None]:
+    """
+    Renew a claimed job's lease every `LEASE_RENEWAL` seconds from a background thread until the block exits,
+    so a long pull isn't requeued while its worker is still running it.
+
+    Parameters
+    ----------
+    job_id : int
+        The claimed job.
+    """
+    stop: threading.Event = threading.Event()
+
+    def renew() -> None:
+        try:
+            while not stop.wait(LEASE_RENEWAL):
+                try:
+                    with shared_db() as db:
+                        db.update_pull_job(job_id)
+                except Exception:
+                    etsy.get_logger().exception(
+                        f"Error renewing the lease of job {job_id}\n"
+                    )
+        finally:
+            close_shared_db()
+
+    thread: threading.Thread = threading.Thread(target=renew, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def run_pull_job(job: dict[str, Any]) -> None:
+    """
+    Exchange the job's authorization code for tokens and pull the shop's data,
+    retrying the pull with exponential backoff.
+
+    The authorization code can only be used once,
+    so a failed token exchange fails the job without retrying.
+    The tokens are stored and the job's `shop_id` set as soon as the exchange succeeds,
+    so a job requeued after its worker stopped resumes with the stored tokens and its remaining attempts.
+
+    Parameters
+    ----------
+    job : dict[str, Any]
+        A job returned by `db.SCDatabased.claim_pull_job()`.
+    """
+    job_id: int = job["job_id"]
+    try:
+        if job["shop_id"] is None:
+            code_verifier: str | None = job["code_verifier"]
+            # queued before jobs stored the code verifier
+            if code_verifier is None:
+                with shared_db() as db:
+                    code_verifier = db.get_oauth(job["state"])["code_verifier"]
+            client: AuthenticatedClient = AuthenticatedClient.from_redirect(
+                job["code"], job["state"], code_verifier
+            )
+            client.save_tokens()
+            with shared_db() as db:
+                db.update_pull_job(job_id, shop_id=client.shop_id)
+        else:
+            client = AuthenticatedClient.from_stored(job["shop_id"])
+    except Exception as e:
+        etsy.get_logger().exception(f"Authentication failed for job {job_id}\n")
+        with shared_db() as db:
+            db.update_pull_job(job_id, status="failed", error=str(e))
+        return
+    if job["attempts"] >= MAX_ATTEMPTS:
+        with shared_db() as db:
+            db.update_pull_job(
+                job_id,
+                status="failed",
+                error="The worker running the last attempt stopped.",
+            )
+        return
+    for attempt in range(job["attempts"] + 1, MAX_ATTEMPTS + 1):
+        with shared_db() as db:
+            db.update_pull_job(job_id, attempts=attempt)
+        try:
+            with metrics.PULL_SECONDS.time():
+                records: int = client.pull_data()
+        except Exception as e:
+            etsy.get_logger().exception(
+                f"Error pulling shop data for job {job_id} (attempt {attempt})\n"
+            )
+            if attempt == MAX_ATTEMPTS:
+                with shared_db() as db:
+                    db.update_pull_job(job_id, status="failed", error=str(e))
+                return
+            with shared_db() as db:
+                db.update_pull_job(job_id, status="retrying", error=str(e))
+            time.sleep(RETRY_DELAY * 2 ** (attempt - 1))
+        else:
+            with shared_db() as db:
+                db.update_pull_job(
+                    job_id,
+                    status="done",
+                    shop_id=client.shop_id,
+                    records=records,
+                    error=None,
+                )
+            return
+
+
+def run_worker(poll_interval: float) -> None:
+    """
+    Process queued pull jobs forever.
+
+    Parameters
+    ----------
+    poll_interval : float
+        Seconds to wait before checking again when the queue is empty.
+    """
+    while True:
+        # log errors like a locked database instead of stopping, an interrupted job is requeued when its lease expires
+        try:
+            with shared_db() as db:
+                job: dict[str, Any] | None = db.claim_pull_job()
+            if job is None:
+                time.sleep(poll_interval)
+                continue
+            with lease(job["job_id"]):
+                run_pull_job(job)
+        except Exception:
+            etsy.get_logger().exception("Error running pull jobs\n")
+            time.sleep(poll_interval)
@@ -0,0 +1,315 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterable, Iterator
+
+# Upper bounds, in seconds, of the latency histogram buckets.
+LATENCY_BUCKETS: tuple[float, ...] = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    """
+    Returns
+    -------
+    str
+        `labels` in Prometheus' '{name="value",...}' format, or an empty string if there aren't any.
+    """
+    if not labels:
+        return ""
+    return (
+        "{"
+        + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items())
+        + "}"
+    )
+
+
+class Metric(ABC):
+    """
+    Base for in process metrics, a series is kept for each combination of label values.
+    """
+
+    type_: str = ""
+
+    def __init__(self, name: str, help_: str, labelnames: tuple[str, ...] = ()) -> None:
+        """
+        Create and register a metric.
+
+        Parameters
+        ----------
+        name : str
+            The metric name.
+        help_ : str
+            The description shown in the exposition.
+        labelnames : tuple[str, ...], optional
+            The labels every observation must give, by default ().
+        """
+        self.name: str = name
+        self.help: str = help_
+        self.labelnames: tuple[str, ...] = labelnames
+        self._lock: threading.Lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"'{self.name}' takes the labels {self.labelnames}, got {tuple(labels)}."
+            )
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    @abstractmethod
+    def _samples(self) -> Iterator[str]:
+        """
+        Yields
+        ------
+        str
+            A line of the exposition for each sample, called with the metric's lock held.
+        """
+
+    def render(self) -> str:
+        """
+        Returns
+        -------
+        str
+            This metric in the Prometheus text exposition format.
+        """
+        with self._lock:
+            samples: list[str] = list(self._samples())
+        return "\n".join(
+            [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type_}"]
+            + samples
+        )
+
+
+class Counter(Metric):
+    """
+    A total that only goes up.
+    """
+
+    type_ = "counter"
+
+    def __init__(self, name: str, help_: str, labelnames: tuple[str, ...] = ()) -> None:
+        super().__init__(name, help_, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        """
+        Increase the series for `labels` by `amount`.
+        """
+        key: tuple[str, ...] = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> Iterator[str]:
+        for key, value in self._values.items():
+            labels: str = _format_labels(dict(zip(self.labelnames, key)))
+            yield f"{self.name}{labels} {value}"
+
+
+class Histogram(Metric):
+    """
+    Observations counted into cumulative buckets, along with their sum and count.
+    """
+
+    type_ = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, help_, labelnames)
+        self.buckets: tuple[float, ...] = buckets
+        # per series: a count for each bucket, the sum, and the total count
+        self._series: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        """
+        Record `value` in the series for `labels`.
+        """
+        key: tuple[str, ...] = self._key(labels)
+        with self._lock:
+            counts, totals = self._series.setdefault(
+                key, ([0] * len(self.buckets), [0.0, 0])
+            )
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            totals[0] += value
+            totals[1] += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """
+        Observe how many seconds the block (or decorated function) takes, even if it raises.
+
+        >>> with PREP_SECONDS.time():
+        >>>     ...
+        """
+        start: float = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> Iterator[str]:
+        for key, (counts, (sum_, count)) in self._series.items():
+            labels: dict[str, str] = dict(zip(self.labelnames, key))
+            for bound, bucket_count in zip(self.buckets, counts):
+                bucket_labels: str = _format_labels(labels | {"le": str(bound)})
+                yield f"{self.name}_bucket{bucket_labels} {bucket_count}"
+            yield f"{self.name}_bucket{_format_labels(labels | {'le': '+Inf'})} {int(count)}"
+            yield f"{self.name}_sum{_format_labels(labels)} {sum_}"
+            yield f"{self.name}_count{_format_labels(labels)} {int(count)}"
+
+
+REGISTRY: list[Metric] = []
+
+API_PAGE_SECONDS: Histogram = Histogram(
+    "sc_api_page_seconds", "Time to get a page of receipts from the Etsy API."
+)
+API_RECEIPTS: Counter = Counter(
+    "sc_api_receipts_total", "Receipts retrieved from the Etsy API."
+)
+PREP_SECONDS: Histogram = Histogram(
+    "sc_prep_seconds", "Time to convert API data to database rows."
+)
+DB_SECONDS: Histogram = Histogram(
+    "sc_db_seconds",
+    "Time to execute database statements, by statement type.",
+    ("statement",),
+)
+EXPORT_SECONDS: Histogram = Histogram(
+    "sc_csv_export_seconds",
+    "Time to generate a full csv export, by content encoding.",
+    ("encoding",),
+)
+EXPORT_BYTES: Counter = Counter(
+    "sc_csv_export_bytes_total", "Bytes of csv export generated.", ("encoding",)
+)
+SALES_EXPORT_SECONDS: Histogram = Histogram(
+    "sc_sales_export_seconds",
+    "Time to generate a full raw sales export, by format.",
+    ("format",),
+)
+SALES_EXPORT_BYTES: Counter = Counter(
+    "sc_sales_export_bytes_total", "Bytes of raw sales export generated.", ("format",)
+)
+WRITER_BATCH_SIZE: Histogram = Histogram(
+    "sc_writer_batch_writes",
+    "Writes grouped into each ingest writer transaction.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+WRITER_COMMIT_SECONDS: Histogram = Histogram(
+    "sc_writer_commit_seconds",
+    "Time to run and commit each ingest writer transaction.",
+)
+PULL_SECONDS: Histogram = Histogram(
+    "sc_pull_seconds", "Time taken by each attempt to pull a shop's data."
+)
+
+
+def time_chunks(
+    chunks: Iterable[bytes], seconds: Histogram, size: Counter, **labels: str
+) -> Iterator[bytes]:
+    """
+    Pass `chunks` through, observing the time spent producing them in `seconds`
+    and counting their bytes in `size`.
+
+    Time the consumer spends between chunks, e.g. sending them to a client, isn't included.
+
+    Parameters
+    ----------
+    chunks : Iterable[bytes]
+        The chunks to time.
+    seconds : Histogram
+        Where to record the total production time once `chunks` is exhausted or closed.
+    size : Counter
+        Where to count the bytes produced.
+
+    Yields
+    ------
+    bytes
+        The chunks of `chunks`.
+    """
+    elapsed: float = 0
+    iterator: Iterator[bytes] = iter(chunks)
+    try:
+        while True:
+            start: float = time.perf_counter()
+            chunk: bytes | None = next(iterator, None)
+            elapsed += time.perf_counter() - start
+            if chunk is None:
+                return
+            size.inc(len(chunk), **labels)
+            yield chunk
+    finally:
+        seconds.observe(elapsed, **labels)
+
+
+def render() -> str:
+    """
+    Returns
+    -------
+    str
+        Every registered metric in the Prometheus text exposition format.
+    """
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+def serve(port: int) -> ThreadingHTTPServer:
+    """
+    Expose `render()` at `/metrics` on the given port from a background thread,
+    for processes that don't run the Flask app.
+
+    Parameters
+    ----------
+    port : int
+        The port to listen on.
+
+    Returns
+    -------
+    ThreadingHTTPServer
+        The running server.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body: bytes = render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args: object) -> None:
+            pass
+
+    server: ThreadingHTTPServer = ThreadingHTTPServer(("", port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
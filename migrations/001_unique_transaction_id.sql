@@ -0,0 +1,29 @@
+-- Keep the most recently saved copy of each transaction.
+DELETE FROM sales
+WHERE
+    rowid NOT IN (
+        SELECT
+            MAX(rowid)
+        FROM
+            sales
+        GROUP BY
+            transaction_id
+    );
+
+CREATE UNIQUE INDEX IF NOT EXISTS sales_transaction_id ON sales (transaction_id);
+
+-- Totals were inflated by the duplicates.
+DELETE FROM monthly_sales;
+
+INSERT INTO
+    monthly_sales (shop_id, year_month, revenue, sales)
+SELECT
+    shop_id,
+    substr(sale_date, 1, 7) AS year_month,
+    SUM(total_price),
+    SUM(quantity)
+FROM
+    sales
+GROUP BY
+    shop_id,
+    year_month;
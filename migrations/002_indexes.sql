@@ -0,0 +1,3 @@
+CREATE INDEX IF NOT EXISTS sales_shop_id_sale_date ON sales (shop_id, sale_date);
+
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, job_id);
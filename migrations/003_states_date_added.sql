@@ -0,0 +1 @@
+CREATE INDEX IF NOT EXISTS states_date_added ON states (date_added);
@@ -0,0 +1,2 @@
+-- The OAuth state is consumed when the callback queues its job, so the job keeps the code verifier itself.
+ALTER TABLE jobs ADD COLUMN code_verifier TEXT;
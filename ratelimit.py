@@ -0,0 +1,269 @@
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Responses worth retrying after waiting.
+RETRY_STATUSES: frozenset[int] = frozenset((429, 500, 502, 503, 504))
+# Of those, the ones where the server didn't process the request, so any method can be resent.
+# The rest may have had an effect and are only retried for GET requests.
+UNPROCESSED_STATUSES: frozenset[int] = frozenset((429, 503))
+
+
+class TokenBucket:
+    """
+    Thread safe token bucket limiting how often requests can be made.
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        """
+        Initialize the bucket full.
+
+        Parameters
+        ----------
+        rate : float
+            Tokens added per second.
+        capacity : float
+            The maximum number of tokens the bucket holds, i.e. the largest allowed burst.
+        """
+        self.rate: float = rate
+        self.capacity: float = capacity
+        self._tokens: float = capacity
+        self._updated: float = time.monotonic()
+        self._lock: threading.Lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """
+        Take a token, waiting until one is available.
+        """
+        while True:
+            with self._lock:
+                now: float = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait: float = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def get_retry_after(response: requests.Response) -> float | None:
+    """
+    Parameters
+    ----------
+    response : requests.Response
+        The response to check.
+
+    Returns
+    -------
+    float | None
+        The number of seconds the `Retry-After` header asks to wait, if present and valid.
+    """
+    value: str | None = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(
+            0,
+            (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds(),
+        )
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """
+    `HTTPAdapter` that takes a token from a shared `TokenBucket` before every request
+    and retries throttled or failed requests with jittered exponential backoff,
+    honouring `Retry-After` when the server sends it.
+    """
+
+    def __init__(
+        self,
+        bucket: TokenBucket,
+        retries: int = 5,
+        backoff_base: float = 0.5,
+        backoff_cap: float = 30,
+        max_retry_after: float = 60,
+        **kwargs: Any,
+    ) -> None:
+        """
+        Initialize the adapter.
+
+        Parameters
+        ----------
+        bucket : TokenBucket
+            The bucket shared by everything that should count against the same limit.
+        retries : int, optional
+            How many times a request is retried, by default 5.
+        backoff_base : float, optional
+            The backoff ceiling in seconds for the first retry, doubled for each subsequent retry. By default 0.5.
+        backoff_cap : float, optional
+            The largest backoff ceiling in seconds, by default 30.
+        max_retry_after : float, optional
+            The longest `Retry-After` in seconds that will be waited out instead of returning the response.
+            By default 60.
+        **kwargs : Any
+            Passed to `HTTPAdapter`.
+        """
+        super().__init__(**kwargs)
+        self.bucket: TokenBucket = bucket
+        self.retries: int = retries
+        self.backoff_base: float = backoff_base
+        self.backoff_cap: float = backoff_cap
+        self.max_retry_after: float = max_retry_after
+
+    def get_backoff(self, attempt: int) -> float:
+        """
+        Parameters
+        ----------
+        attempt : int
+            The zero based attempt that failed.
+
+        Returns
+        -------
+        float
+            A random ("full jitter") delay up to the exponential backoff ceiling for `attempt`.
+        """
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2**attempt))
+
+    def send(
+        self, request: requests.PreparedRequest, **kwargs: Any
+    ) -> requests.Response:
+        attempt: int = 0
+        while True:
+            self.bucket.acquire()
+            delay: float | None = None
+            try:
+                response: requests.Response = super().send(request, **kwargs)
+            except requests.ConnectionError:
+                # only safe to resend if the request can't have had an effect
+                if request.method != "GET" or attempt == self.retries:
+                    raise
+            else:
+                if (
+                    response.status_code not in RETRY_STATUSES
+                    or attempt == self.retries
+                    or (
+                        request.method != "GET"
+                        and response.status_code not in UNPROCESSED_STATUSES
+                    )
+                ):
+                    return response
+                delay = get_retry_after(response)
+                # e.g. the daily limit, better to fail than to block for hours
+                if delay is not None and delay > self.max_retry_after:
+                    return response
+                response.close()
+            time.sleep(self.get_backoff(attempt) if delay is None else delay)
+            attempt += 1
+
+
+# Shared by every `AuthenticatedClient` in the process, made by `get_bucket()` on first use.
+BUCKET: TokenBucket | None = None
+_bucket_lock: threading.Lock = threading.Lock()
+# Default number of keep-alive connections the shared adapter holds per host,
+# enough for a few clients fetching pages concurrently.
+POOL_SIZE: int = 16
+
+_shared_adapter: tuple[int, RateLimitedAdapter] | None = None
+_shared_adapter_lock: threading.Lock = threading.Lock()
+
+
+def get_bucket() -> TokenBucket:
+    """
+    Get the process wide bucket, making it on first use.
+
+    Its rate and burst are read from the `sc_rate-limit` and `sc_rate-burst` environment variables then,
+    not at import, so they can come from a '.env' file loaded after this module is imported.
+    Both default to Etsy's limit of 10 requests per second per app.
+
+    Returns
+    -------
+    TokenBucket
+        The bucket.
+    """
+    global BUCKET
+    with _bucket_lock:
+        if BUCKET is None:
+            BUCKET = TokenBucket(
+                float(os.getenv("sc_rate-limit", 10)),
+                float(os.getenv("sc_rate-burst", 10)),
+            )
+        return BUCKET
+
+
+def split_rate_limit(processes: int) -> None:
+    """
+    Limit this process to its share of the rate limit when `processes` processes call the API at once,
+    since Etsy's limit is per app, not per process.
+
+    Sets the `sc_rate-limit` and `sc_rate-burst` environment variables `get_bucket()` reads,
+    so it should be called in each process before its first request.
+
+    Parameters
+    ----------
+    processes : int
+        The number of processes sharing the limit.
+    """
+    if processes <= 1:
+        return
+    os.environ["sc_rate-limit"] = str(float(os.getenv("sc_rate-limit", 10)) / processes)
+    # a burst under one token would never allow a request
+    os.environ["sc_rate-burst"] = str(
+        max(float(os.getenv("sc_rate-burst", 10)) / processes, 1)
+    )
+
+
+def get_shared_adapter() -> RateLimitedAdapter:
+    """
+    Get the process wide adapter, limited by `get_bucket()`.
+
+    Sessions it's mounted on share its pool of keep-alive connections,
+    so a new client reuses connections opened by earlier ones instead of making new TLS handshakes.
+
+    The pool size can be set with the `sc_http-pool-size` environment variable, by default `POOL_SIZE`.
+
+    Returns
+    -------
+    RateLimitedAdapter
+        The adapter, a new one is made in a forked process so sockets are never shared between processes.
+    """
+    global _shared_adapter
+    with _shared_adapter_lock:
+        if _shared_adapter is None or _shared_adapter[0] != os.getpid():
+            pool_size: int = int(os.getenv("sc_http-pool-size", POOL_SIZE))
+            _shared_adapter = (
+                os.getpid(),
+                RateLimitedAdapter(
+                    get_bucket(), pool_connections=pool_size, pool_maxsize=pool_size
+                ),
+            )
+        return _shared_adapter[1]
+
+
+def mount_shared_adapter(session: requests.Session) -> None:
+    """
+    Send all of `session`'s requests through `get_shared_adapter()`.
+
+    Parameters
+    ----------
+    session : requests.Session
+        The session to mount the adapter on.
+    """
+    adapter: RateLimitedAdapter = get_shared_adapter()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
@@ -0,0 +1,17 @@
+import export_cache
+from db import SCDatabased
+
+
+def main() -> None:
+    """Rebuild the 'monthly_sales' rollup table from the raw 'sales' table."""
+    with SCDatabased() as db:
+        db.rebuild_monthly_sales()
+        shop_ids: list[int] = [
+            row["shop_id"] for row in db.select("shops", ["shop_id"])
+        ]
+    # cached exports were built from the old rollup
+    export_cache.bump_data_version(shop_ids)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import dotenv
+from pathier import Pathier
+
+import etsy
+from db import shared_db
+from etsy import AuthenticatedClient
+
+
+def get_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Pull new sales data for registered shops using their stored tokens."
+    )
+    parser.add_argument(
+        "shop_ids",
+        type=int,
+        nargs="*",
+        help="The shops to pull. Defaults to every shop with stored tokens.",
+    )
+    parser.add_argument(
+        "-i",
+        "--interval",
+        type=float,
+        default=None,
+        help="Repeat every this many seconds instead of running once.",
+    )
+    parser.add_argument(
+        "-m",
+        "--max-in-flight",
+        type=int,
+        default=4,
+        help="The maximum number of shops pulled at once.",
+    )
+    return parser.parse_args()
+
+
+def pull_shop(shop_id: int) -> int:
+    """
+    Pull new sales data for a shop using its stored tokens.
+
+    Parameters
+    ----------
+    shop_id : int
+        The shop to pull.
+
+    Returns
+    -------
+    int
+        The number of records retrieved, -1 if the pull failed.
+    """
+    try:
+        return AuthenticatedClient.from_stored(shop_id).pull_data()
+    except Exception:
+        etsy.get_logger().exception(f"Error re-pulling shop '{shop_id}'\n")
+        return -1
+
+
+def repull(shop_ids: list[int], max_in_flight: int) -> None:
+    """
+    Pull the given shops, or every shop with stored tokens, with at most `max_in_flight` at once.
+
+    Parameters
+    ----------
+    shop_ids : list[int]
+        The shops to pull. If empty, every shop with stored tokens is pulled.
+    max_in_flight : int
+        The maximum number of shops pulled at once.
+    """
+    if not shop_ids:
+        with shared_db() as db:
+            shop_ids = db.get_token_shop_ids()
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        results: list[int] = list(executor.map(pull_shop, shop_ids))
+    failed: int = results.count(-1)
+    etsy.get_logger().info(
+        f"Re-pulled {len(shop_ids) - failed} of {len(shop_ids)} shops, {sum(result for result in results if result > 0)} records retrieved."
+    )
+
+
+def main(args: argparse.Namespace | None = None) -> None:
+    """Re-pull shops once or on an interval."""
+    args = args or get_args()
+    dotenv.load_dotenv(Pathier(__file__).parent / ".env")
+    while True:
+        repull(args.shop_ids, args.max_in_flight)
+        if args.interval is None:
+            return
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
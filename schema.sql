@@ -17,4 +17,47 @@ CREATE TABLE
         total_price REAL,
         sale_date TIMESTAMP,
         date_added TIMESTAMP
-    );
\ No newline at end of file
+    );
+
+CREATE TABLE
+    IF NOT EXISTS monthly_sales (
+        shop_id INTEGER REFERENCES shops (shop_id) ON DELETE RESTRICT,
+        year_month TEXT,
+        revenue REAL,
+        sales INTEGER,
+        PRIMARY KEY (shop_id, year_month)
+    );
+
+
+CREATE TABLE
+    IF NOT EXISTS jobs (
+        job_id INTEGER PRIMARY KEY,
+        state TEXT UNIQUE,
+        code TEXT,
+        status TEXT,
+        shop_id INTEGER,
+        attempts INTEGER,
+        records INTEGER,
+        error TEXT,
+        date_added TIMESTAMP,
+        date_updated TIMESTAMP
+    );
+
+
+CREATE TABLE
+    IF NOT EXISTS sync_state (
+        shop_id INTEGER PRIMARY KEY REFERENCES shops (shop_id) ON DELETE RESTRICT,
+        last_created INTEGER,
+        last_receipt_id INTEGER,
+        date_synced TIMESTAMP
+    );
+
+
+CREATE TABLE
+    IF NOT EXISTS tokens (
+        shop_id INTEGER PRIMARY KEY REFERENCES shops (shop_id) ON DELETE RESTRICT,
+        access_token TEXT,
+        refresh_token TEXT,
+        expiry TIMESTAMP,
+        date_updated TIMESTAMP
+    );
@@ -0,0 +1,94 @@
+import argparse
+import multiprocessing
+import threading
+
+import dotenv
+from pathier import Pathier
+
+import jobs
+import metrics
+import ratelimit
+
+
+def get_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Run background workers that process queued Etsy data pulls."
+    )
+    parser.add_argument(
+        "-p",
+        "--processes",
+        type=int,
+        default=1,
+        help="The number of worker processes to run.",
+    )
+    parser.add_argument(
+        "-t",
+        "--threads",
+        type=int,
+        default=1,
+        help="The number of jobs each process runs at once. Threads in a process share its ingest writer, so prefer them to more processes.",
+    )
+    parser.add_argument(
+        "-i",
+        "--poll-interval",
+        type=float,
+        default=2,
+        help="Seconds to wait between checks of an empty queue.",
+    )
+    parser.add_argument(
+        "-m",
+        "--metrics-port",
+        type=int,
+        default=None,
+        help="Serve each process's metrics at '/metrics' on this port, incrementing it for each additional process.",
+    )
+    return parser.parse_args()
+
+
+def run(
+    poll_interval: float,
+    metrics_port: int | None,
+    threads: int = 1,
+    processes: int = 1,
+) -> None:
+    """
+    Serve this process's metrics, if given a port, and run `jobs.run_worker()` in `threads` threads,
+    limited to this process's share of the rate limit if it's one of `processes` processes.
+    """
+    ratelimit.split_rate_limit(processes)
+    if metrics_port is not None:
+        metrics.serve(metrics_port)
+    for _ in range(threads - 1):
+        threading.Thread(
+            target=jobs.run_worker, args=(poll_interval,), daemon=True
+        ).start()
+    jobs.run_worker(poll_interval)
+
+
+def main(args: argparse.Namespace | None = None) -> None:
+    """Run `jobs.run_worker()` in the requested number of processes."""
+    args = args or get_args()
+    dotenv.load_dotenv(Pathier(__file__).parent / ".env")
+    if args.processes == 1:
+        run(args.poll_interval, args.metrics_port, args.threads)
+        return
+    workers: list[multiprocessing.Process] = [
+        multiprocessing.Process(
+            target=run,
+            args=(
+                args.poll_interval,
+                None if args.metrics_port is None else args.metrics_port + i,
+                args.threads,
+                args.processes,
+            ),
+        )
+        for i in range(args.processes)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+if __name__ == "__main__":
+    main()
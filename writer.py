@@ -0,0 +1,269 @@
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, TypeVar, cast
+
+import loggi
+from pathier import Pathier
+
+import export_cache
+import metrics
+from db import SCDatabased, close_shared_db, shared_db
+from exceptions import WriterStoppedException
+
+T = TypeVar("T")
+
+# Writes grouped into one transaction at most.
+MAX_BATCH: int = 64
+# Writes waiting to be committed at most before `submit()` blocks.
+MAX_PENDING: int = 256
+
+Write = Callable[[SCDatabased], Any]
+
+
+def get_logger() -> loggi.Logger:
+    """
+    Returns
+    -------
+    loggi.Logger
+        An ingest writer logger.
+    """
+    return loggi.getLogger("writer", Pathier(__file__).parent / "logs")
+
+
+class _Item:
+    """A queued write and the future its producer waits on."""
+
+    __slots__ = ("write", "shop_id", "after", "future")
+
+    def __init__(
+        self,
+        write: Write,
+        shop_id: int | None,
+        after: "Future[Any] | None",
+        future: "Future[Any]",
+    ) -> None:
+        self.write: Write = write
+        self.shop_id: int | None = shop_id
+        self.after: Future[Any] | None = after
+        self.future: Future[Any] = future
+
+
+class IngestWriter:
+    """
+    A thread that owns this process's write connection and makes every ingest write on it.
+
+    Producers `submit()` writes to a queue and get a future back.
+    The writer takes whatever is queued, up to `max_batch` writes, runs it in one transaction,
+    and resolves each write's future once that transaction is committed.
+    Under load, writes from every producer share transactions instead of queueing for the database lock one at a time.
+    """
+
+    def __init__(
+        self, max_batch: int = MAX_BATCH, max_pending: int = MAX_PENDING
+    ) -> None:
+        """
+        Parameters
+        ----------
+        max_batch : int, optional
+            The most writes grouped into one transaction, by default `MAX_BATCH`.
+        max_pending : int, optional
+            The most writes waiting to be committed before `submit()` blocks, by default `MAX_PENDING`.
+        """
+        self.max_batch: int = max_batch
+        self._queue: queue.Queue[_Item | None] = queue.Queue(max_pending)
+        self._thread: threading.Thread = threading.Thread(
+            target=self._run, name="ingest-writer", daemon=True
+        )
+        self._thread.start()
+
+    def submit(
+        self,
+        write: Callable[[SCDatabased], T],
+        shop_id: int | None = None,
+        after: "Future[Any] | None" = None,
+    ) -> "Future[T]":
+        """
+        Queue a write for the writer thread.
+
+        Parameters
+        ----------
+        write : Callable[[SCDatabased], T]
+            Called with the writer's connection, it shouldn't commit.
+        shop_id : int | None, optional
+            The shop whose sales `write` changes, by default `None`.
+            The shop's data version is bumped once the write is committed.
+        after : Future[Any] | None, optional
+            A previously submitted write this one depends on, by default `None`.
+            If that write fails, this one fails with the same error without being run.
+
+        Returns
+        -------
+        Future[T]
+            Resolves to `write`'s return value once it's committed,
+            or to its exception if it failed.
+
+        Raises
+        ------
+        WriterStoppedException
+            If the writer thread isn't running.
+        """
+        if not self.alive:
+            raise WriterStoppedException()
+        future: Future[T] = Future()
+        self._queue.put(_Item(write, shop_id, after, future))
+        return future
+
+    @property
+    def alive(self) -> bool:
+        """Whether the writer thread is running."""
+        return self._thread.is_alive()
+
+    def stop(self) -> None:
+        """
+        Commit everything already submitted and stop the writer thread.
+        """
+        if self.alive:
+            self._queue.put(None)
+            self._thread.join()
+
+    def _run(self) -> None:
+        try:
+            while True:
+                item: _Item | None = self._queue.get()
+                batch: list[_Item] = []
+                while item is not None:
+                    batch.append(item)
+                    if len(batch) == self.max_batch:
+                        break
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                if batch:
+                    self._write_batch(batch)
+                if item is None:
+                    return
+        finally:
+            close_shared_db()
+
+    def _write_batch(self, batch: list[_Item]) -> None:
+        """
+        Write `batch`, failing any of its writes that are still unresolved if that raises,
+        e.g. because the database can't be opened, so the thread keeps serving later batches.
+        """
+        try:
+            with shared_db() as db:
+                self._write(db, batch)
+        except Exception as e:
+            get_logger().exception(f"Ingest writer failed a batch of {len(batch)}\n")
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(e)
+
+    def _write(self, db: SCDatabased, batch: list[_Item]) -> None:
+        """
+        Run `batch` in one transaction.
+
+        If it fails, it's rolled back and each write is retried in its own transaction,
+        so only the writes that actually fail, and those that depend on them, are failed.
+        """
+        metrics.WRITER_BATCH_SIZE.observe(len(batch))
+        # writes whose dependencies failed in an earlier batch never run
+        for item in batch:
+            if item.after is not None and item.after.done() and item.after.exception():
+                item.future.set_exception(cast(BaseException, item.after.exception()))
+        pending: list[_Item] = [item for item in batch if not item.future.done()]
+        connection: sqlite3.Connection = cast(sqlite3.Connection, db.connection)
+        try:
+            with metrics.WRITER_COMMIT_SECONDS.time():
+                results: list[Any] = [item.write(db) for item in pending]
+                db.commit()
+        except Exception:
+            connection.rollback()
+            self._write_each(db, pending)
+            return
+        self._bump_versions(pending)
+        for item, result in zip(pending, results):
+            item.future.set_result(result)
+
+    def _write_each(self, db: SCDatabased, batch: list[_Item]) -> None:
+        connection: sqlite3.Connection = cast(sqlite3.Connection, db.connection)
+        failed: dict[int, BaseException] = {}
+        for item in batch:
+            error: BaseException | None = (
+                failed.get(id(item.after)) if item.after is not None else None
+            )
+            if error is None:
+                try:
+                    with metrics.WRITER_COMMIT_SECONDS.time():
+                        result: Any = item.write(db)
+                        db.commit()
+                except Exception as e:
+                    connection.rollback()
+                    error = e
+            if error is not None:
+                failed[id(item.future)] = error
+                item.future.set_exception(error)
+                continue
+            self._bump_versions([item])
+            item.future.set_result(result)
+
+    @staticmethod
+    def _bump_versions(items: list[_Item]) -> None:
+        shop_ids: set[int] = {
+            item.shop_id for item in items if item.shop_id is not None
+        }
+        if not shop_ids:
+            return
+        # the writes are already committed, so their producers shouldn't see this as a failure
+        try:
+            export_cache.bump_data_version(shop_ids)
+        except Exception:
+            get_logger().exception(
+                f"Error bumping the data version of shops {sorted(shop_ids)}\n"
+            )
+
+
+_writer: tuple[int, IngestWriter] | None = None
+_writer_lock: threading.Lock = threading.Lock()
+
+
+def get_writer() -> IngestWriter:
+    """
+    Get the process wide writer, starting it on first use or if its thread has died.
+
+    It's stopped, after committing what's queued, when the interpreter exits.
+
+    The most writes per transaction can be set with the `sc_writer-batch` environment variable, by default `MAX_BATCH`.
+
+    Returns
+    -------
+    IngestWriter
+        The writer, a new one is started in a forked process since threads don't survive a fork.
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is None or _writer[0] != os.getpid() or not _writer[1].alive:
+            writer: IngestWriter = IngestWriter(
+                int(os.getenv("sc_writer-batch", MAX_BATCH))
+            )
+            atexit.register(writer.stop)
+            _writer = (os.getpid(), writer)
+        return _writer[1]
+
+
+def stop_writer() -> None:
+    """
+    Stop the process wide writer, if it's running, after committing what's queued.
+
+    The next `get_writer()` starts a new one, picking up any change to `sc_db-path`.
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is not None and _writer[0] == os.getpid():
+            _writer[1].stop()
+        _writer = None